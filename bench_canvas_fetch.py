@@ -0,0 +1,47 @@
+import os
+import time
+from dotenv import load_dotenv
+from lib.canvas_client import CanvasClient
+from lib.canvas_api import list_active_courses, fetch_due_assignments_for_courses, fetch_due_assignments_from_planner
+
+"""
+Compare the two Canvas fetch strategies used by /canvas_sync.
+Read-only: nothing is written to Google Tasks or sync.db.
+Usage: python bench_canvas_fetch.py
+"""
+
+def run_mode(mode: str, base_url: str, token: str) -> dict:
+    # Fresh client per mode, no response cache, so both pay full price
+    canvas_client = CanvasClient(base_url, token)
+
+    started = time.perf_counter()
+    courses = list_active_courses(canvas_client)
+    if mode == "planner":
+        fetches = list(fetch_due_assignments_from_planner(canvas_client, courses))
+    else:
+        fetches = list(fetch_due_assignments_for_courses(canvas_client, courses))
+    elapsed = time.perf_counter() - started
+
+    metrics = canvas_client.governor.metrics()
+    return {
+        "mode": mode,
+        "courses": len(courses),
+        "assignments": sum(len(f.assignments) for f in fetches),
+        "errors": sum(1 for f in fetches if f.error),
+        "requests": metrics["requests"],
+        "cost": metrics["total_cost"],
+        "seconds": round(elapsed, 2),
+    }
+
+if __name__ == "__main__":
+    load_dotenv()
+    base_url = os.getenv("CANVAS_BASE_URL")
+    token = os.getenv("CANVAS_TOKEN")
+    if not base_url or not token:
+        raise ValueError("Set CANVAS_BASE_URL and CANVAS_TOKEN in .env to run the benchmark.")
+
+    results = [run_mode(mode, base_url, token) for mode in ("courses", "planner")]
+
+    print(f"{'mode':<10}{'courses':>9}{'assignments':>13}{'errors':>8}{'requests':>10}{'cost':>10}{'seconds':>9}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['courses']:>9}{r['assignments']:>13}{r['errors']:>8}{r['requests']:>10}{r['cost']:>10}{r['seconds']:>9}")
@@ -1,7 +1,11 @@
 import os
+import sys
 import json
+import time
+import random
 import asyncio
 import functools
+import subprocess
 import discord
 from discord import app_commands
 from dotenv import load_dotenv
@@ -9,17 +13,24 @@ from datetime import datetime
 from lib.parser import parse_text, ParsedItem
 from lib.ui import ConfirmView, build_preview_embed, SelectTaskView
 
-# Choose between OpenAI and Ollama
-# View line 381 to switch from OpenAI to Ollama
+# Choose between OpenAI and Ollama with LLM_BACKEND
 from lib.openai_client import get_openai_response
-from lib.ollama import get_ollama_response
+from lib.openai_client import stream_openai_response
+from lib.ollama import get_ollama_response, stream_ollama_response, warm_up_ollama, close_ollama
+from lib.json_stream import IncrementalJSONObjectParser
+from lib.llm_cache import get_parse_cache
 
 
-from lib.google_calendar import create_calendar_event, create_task, list_today_items, list_open_tasks, done_task, delete_task
-from lib.google_auth import get_creds
+from lib.google_calendar import insert_calendar_event, insert_task, list_today_items, list_open_tasks, refresh_open_tasks, snapshot_tasks, done_task, done_tasks, delete_task
+from lib.google_auth import get_creds, get_credential_manager
+from lib.credential_store import get_user_store
 from lib.fuzz_match import get_best_match
 from lib.canvas_client import CanvasClient
+from lib.canvas_cache import CanvasResponseCache
+from lib.replica import LocalReplica
 from lib.canvas_sync import sync_canvas_assignments_to_google_tasks
+from lib.sync_scheduler import SyncCoordinator
+from lib.sync_jobs import SyncJobQueue, SHARED_ACCOUNT_ID
 
 # Load the environmental variables from .env file
 load_dotenv()
@@ -31,6 +42,202 @@ GUILD_ID = 000000000000000  # Replace with your server ID
 # Add small pending items storage
 PENDING = {}
 
+# Snapshot of open tasks, refreshed with updatedMin deltas so /done and /delete
+# only transfer what changed since the last command
+OPEN_TASKS = {"snapshot": None}
+
+def get_open_tasks(creds) -> list[dict]:
+    OPEN_TASKS["snapshot"] = refresh_open_tasks(creds, OPEN_TASKS["snapshot"])
+    return snapshot_tasks(OPEN_TASKS["snapshot"])
+
+# Local copy of Google Tasks/Calendar that commands read from while it is fresh
+REPLICA = LocalReplica()
+REPLICA_REFRESH_SECONDS = int(os.getenv("REPLICA_REFRESH_SECONDS", "60"))
+REPLICA_MAX_AGE_SECONDS = int(os.getenv("REPLICA_MAX_AGE_SECONDS", "300"))
+
+async def refresh_replica_forever():
+    # Keep the replica warm in the background, commands never wait on this
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            creds = await loop.run_in_executor(None, get_creds)
+            await loop.run_in_executor(None, REPLICA.refresh, creds)
+        except Exception as e:
+            print(f"Replica refresh failed: {e}")
+        await asyncio.sleep(REPLICA_REFRESH_SECONDS)
+
+def uses_shared_account(user_id: int) -> bool:
+    # Users who linked their own Google account don't share the replica or snapshot
+    store = get_user_store()
+    return not (store and store.has_user(user_id))
+
+# Conditional request cache for Canvas pages, shared across syncs
+CANVAS_CACHE = CanvasResponseCache(max_bytes=int(os.getenv("CANVAS_CACHE_MAX_MB", "50")) * 1024 * 1024)
+
+def canvas_configured() -> bool:
+    return bool(os.getenv("CANVAS_TOKEN") and os.getenv("CANVAS_BASE_URL"))
+
+def run_canvas_sync(full: bool = False, on_progress=None) -> dict:
+    # Blocking, always run through CANVAS_SYNC so only one sync touches sync.db at a time
+    if not canvas_configured():
+        raise ValueError("Canvas API credentials not configured. Set CANVAS_TOKEN and CANVAS_BASE_URL in .env")
+
+    canvas_client = CanvasClient(os.getenv("CANVAS_BASE_URL"), os.getenv("CANVAS_TOKEN"), cache=CANVAS_CACHE)
+    return sync_canvas_assignments_to_google_tasks(
+        canvas_client,
+        get_creds(),
+        max_concurrency=int(os.getenv("CANVAS_SYNC_CONCURRENCY", "8")),
+        full_resync=full,
+        fetch_mode=os.getenv("CANVAS_FETCH_MODE", "courses"),
+        write_workers=int(os.getenv("CANVAS_SYNC_WRITE_WORKERS", "2")),
+        on_progress=on_progress
+    )
+
+# Scheduled and manual syncs share one in-flight run
+CANVAS_SYNC = SyncCoordinator(run_canvas_sync)
+CANVAS_SYNC_INTERVAL_SECONDS = int(os.getenv("CANVAS_SYNC_INTERVAL_SECONDS", "1800"))
+CANVAS_SYNC_JITTER = float(os.getenv("CANVAS_SYNC_JITTER", "0.1"))
+
+# Discord rate-limits message edits, so progress is shown at most this often
+SYNC_PROGRESS_EDIT_SECONDS = 2.0
+
+# Queue mode: syncs run as jobs in worker processes (lib/sync_worker.py), one per user
+CANVAS_SYNC_QUEUE = os.getenv("CANVAS_SYNC_QUEUE", "0") == "1"
+# Worker processes the bot starts itself, 0 if they run somewhere else
+CANVAS_SYNC_WORKERS = int(os.getenv("CANVAS_SYNC_WORKERS", str(os.cpu_count() or 1)))
+# How long the bot waits for its sync workers to exit before killing them
+SYNC_WORKER_SHUTDOWN_SECONDS = int(os.getenv("SYNC_WORKER_SHUTDOWN_SECONDS", "30"))
+# How long /canvas_sync keeps showing a queued job before leaving it to the background,
+# kept well under the 15 minutes Discord lets a command edit its reply
+CANVAS_SYNC_WAIT_SECONDS = int(os.getenv("CANVAS_SYNC_WAIT_SECONDS", "600"))
+SYNC_JOBS = SyncJobQueue(shards=max(1, CANVAS_SYNC_WORKERS)) if CANVAS_SYNC_QUEUE else None
+
+def sync_account_for(user_id: int) -> int:
+    # Users with their own linked accounts get their own sync, everyone else shares one
+    return SHARED_ACCOUNT_ID if uses_shared_account(user_id) else user_id
+
+async def enqueue_syncs_forever():
+    # Queue mode's scheduler: a job for the shared account and every user with linked accounts
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(CANVAS_SYNC_INTERVAL_SECONDS * random.uniform(1 - CANVAS_SYNC_JITTER, 1 + CANVAS_SYNC_JITTER))
+        try:
+            accounts = [SHARED_ACCOUNT_ID] if canvas_configured() else []
+            store = get_user_store()
+            if store:
+                accounts += store.canvas_users()
+            for account in accounts:
+                await loop.run_in_executor(None, SYNC_JOBS.enqueue, account)
+            print(f"Queued {len(accounts)} scheduled Canvas sync(s): {SYNC_JOBS.stats()}")
+        except Exception as e:
+            print(f"Scheduling Canvas syncs failed: {e}")
+
+def format_sync_summary(summary: dict) -> str:
+    return (
+        f"**Canvas Sync Complete**\n\n"
+        f"Created: {summary['created']}\n"
+        f"Updated: {summary['updated']}\n"
+        f"⏭Skipped: {summary['skipped']}\n"
+        f"Errors: {summary['errors']}"
+    )
+
+def format_sync_progress(event: dict) -> str:
+    courses = f"{event['courses_done']}/{event['courses_total']}" if event["courses_total"] else "listing"
+    return (
+        f"**Canvas Sync Running...** ({event['elapsed_s']:.0f}s)\n\n"
+        f"Courses: {courses}\n"
+        f"Assignments checked: {event['assignments']} ({event['assignments_per_sec']}/s)\n"
+        f"Created: {event['created']}  Updated: {event['updated']}  Skipped: {event['skipped']}  Errors: {event['errors']}"
+    )
+
+# /add trusts the local parser at or above this confidence, below it asks the LLM (above 1 = always the LLM)
+LOCAL_PARSE_THRESHOLD = float(os.getenv("LOCAL_PARSE_THRESHOLD", "0.75"))
+PARSE_TIERS = {"local": 0, "llm": 0}
+
+# "openai" or "ollama", which LLM parses what the local parser can't
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+
+# Stream LLM output so /add can preview fields as they arrive
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+# Minimum time between edits of a streaming /add preview
+ADD_PREVIEW_EDIT_SECONDS = 0.75
+
+# How often expired LLM parses are dropped from the cache (they expire at midnight)
+LLM_CACHE_PURGE_SECONDS = int(os.getenv("LLM_CACHE_PURGE_SECONDS", "3600"))
+
+async def purge_parse_cache_forever(parse_cache):
+    # Expired rows are never served, but would otherwise stay on disk for good
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            removed = await loop.run_in_executor(None, parse_cache.purge_expired)
+            if removed:
+                print(f"Purged {removed} expired LLM parse(s)")
+        except Exception as e:
+            print(f"Purging the LLM parse cache failed: {e}")
+        await asyncio.sleep(LLM_CACHE_PURGE_SECONDS)
+
+async def stream_llm_fields(text: str, on_fields) -> dict | None:
+    """Stream the LLM's reply, calling on_fields(fields so far) whenever another top-level field completes."""
+    parser = IncrementalJSONObjectParser()
+    stream = stream_ollama_response(text) if LLM_BACKEND == "ollama" else stream_openai_response(text)
+    started = time.perf_counter()
+    first_field = None
+    async for chunk in stream:
+        if parser.feed(chunk):
+            if first_field is None:
+                first_field = time.perf_counter() - started
+            on_fields(dict(parser.fields))
+    if first_field is not None:
+        print(f"LLM stream: first field after {first_field * 1000:.0f}ms, done after {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    try:
+        return json.loads(parser.buffer)
+    except json.JSONDecodeError:
+        # Still usable if the object was complete but wrapped in a code fence or prose
+        return dict(parser.fields) if parser.done else None
+
+async def parse_add_text(text: str, on_fields=None) -> dict | None:
+    """
+    Parse /add text into the preview payload: locally when confident, otherwise with the LLM. None if the LLM output is unusable.
+    With on_fields, LLM output is streamed and on_fields(fields so far) is called as each field completes.
+    """
+    loop = asyncio.get_event_loop()
+    started = time.perf_counter()
+    try:
+        parsed = await loop.run_in_executor(None, parse_text, text)
+    except Exception as e:
+        print(f"Local parse failed, using the LLM: {e}")
+        parsed = None
+
+    if parsed is not None and parsed.confidence >= LOCAL_PARSE_THRESHOLD:
+        PARSE_TIERS["local"] += 1
+        print(f"Parsed locally in {(time.perf_counter() - started) * 1000:.1f}ms (confidence {parsed.confidence}), tiers: {PARSE_TIERS}")
+        return parsed.to_payload()
+
+    # Call the LLM asynchronously to parse the text
+    PARSE_TIERS["llm"] += 1
+    payload = None
+    if LLM_STREAMING and on_fields is not None:
+        payload = await stream_llm_fields(text, on_fields)
+    else:
+        if LLM_BACKEND == "ollama":
+            llm_response = await get_ollama_response(text)
+        else:
+            llm_response = await get_openai_response(text)
+        try:
+            payload = json.loads(llm_response)
+        except json.JSONDecodeError:
+            pass
+
+    confidence = parsed.confidence if parsed is not None else None
+    print(f"Parsed with the LLM in {(time.perf_counter() - started) * 1000:.0f}ms (local confidence {confidence}), tiers: {PARSE_TIERS}")
+    parse_cache = get_parse_cache()
+    if parse_cache is not None:
+        # stats() counts rows on disk, log it from the executor without holding up /add
+        asyncio.get_event_loop().run_in_executor(None, lambda: print(f"LLM parse cache: {parse_cache.stats()}"))
+    return payload
+
 class MyClient(discord.Client):
 
     # Initialize the bot with necessary intents
@@ -38,6 +245,7 @@ class MyClient(discord.Client):
         intents = discord.Intents.default()
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
+        self.sync_workers = None
 
     # Setup hook to sync commands to the guild
     async def setup_hook(self):
@@ -46,7 +254,57 @@ class MyClient(discord.Client):
         self.tree.copy_global_to(guild=guild)
         await self.tree.sync(guild=guild)
         print("Bot is ready and commands are synced.")
+
+        # Load Google credentials once, then keep them refreshed in the background
+        await self.loop.run_in_executor(None, get_creds)
+        get_credential_manager().start_background_refresh()
+
+        # Per-user credentials get one shared refresher that also evicts idle users
+        store = get_user_store()
+        if store:
+            store.start_background_refresh()
+
+        # Start keeping the local task/event replica fresh
+        self.loop.create_task(refresh_replica_forever())
+
+        # Clear out yesterday's parses now and every LLM_CACHE_PURGE_SECONDS after
+        parse_cache = get_parse_cache()
+        if parse_cache is not None:
+            self.loop.create_task(purge_parse_cache_forever(parse_cache))
+
+        # Load the Ollama model now so the first /add doesn't wait for it
+        if LLM_BACKEND == "ollama":
+            self.loop.create_task(warm_up_ollama())
+
+        # Sync Canvas in the background so /canvas_sync is rarely needed
+        if SYNC_JOBS:
+            if CANVAS_SYNC_WORKERS > 0:
+                # Separate process tree, so no sync ever competes with the bot's event loop
+                self.sync_workers = subprocess.Popen([
+                    sys.executable, "-m", "lib.sync_worker",
+                    "--workers", str(CANVAS_SYNC_WORKERS),
+                    # The workers exit on their own if the bot dies without closing them
+                    "--parent-pid", str(os.getpid())
+                ])
+            if CANVAS_SYNC_INTERVAL_SECONDS > 0:
+                self.loop.create_task(enqueue_syncs_forever())
+        elif CANVAS_SYNC_INTERVAL_SECONDS > 0 and canvas_configured():
+            self.loop.create_task(CANVAS_SYNC.run_forever(CANVAS_SYNC_INTERVAL_SECONDS, CANVAS_SYNC_JITTER))
     
+    async def close(self):
+        # Shut the pooled Ollama connection down with the bot
+        await close_ollama()
+
+        # Let the sync workers finish their current job, a job cut short is retried once its lease runs out
+        if self.sync_workers and self.sync_workers.poll() is None:
+            self.sync_workers.terminate()
+            try:
+                await self.loop.run_in_executor(None, self.sync_workers.wait, SYNC_WORKER_SHUTDOWN_SECONDS)
+            except subprocess.TimeoutExpired:
+                self.sync_workers.kill()
+                await self.loop.run_in_executor(None, self.sync_workers.wait)
+        await super().close()
+
 # Create the client instance
 client = MyClient()
 
@@ -66,7 +324,10 @@ async def help_command(interaction: discord.Interaction):
         "/list - List today's events and tasks.\n"
         "/done <item> - Mark an item as completed.\n"
         "/delete <item> - Delete an item.\n"
-        "/canvas_sync - Sync Canvas assignments to Google Tasks.\n"
+        "/canvas_sync [full] - Sync Canvas assignments to Google Tasks.\n"
+        "/link_google [code] - Use your own Google account with the bot.\n"
+        "/link_canvas <token> - Sync your own Canvas account (after /link_google).\n"
+        "/unlink - Forget your own Google and Canvas accounts.\n"
         # Add more commands here as needed
     )
     await interaction.response.send_message(help_text, ephemeral=True)
@@ -76,11 +337,14 @@ async def help_command(interaction: discord.Interaction):
 async def list_items(interaction: discord.Interaction):
     await interaction.response.defer(thinking=True, ephemeral=True)
 
-    # Get the google API credentials
-    creds = get_creds()
-
-    # List today's items
-    items = list_today_items(creds)
+    # Answer from the local replica when it is fresh, otherwise ask Google
+    shared = uses_shared_account(interaction.user.id)
+    if shared and REPLICA.is_fresh(REPLICA_MAX_AGE_SECONDS):
+        items = REPLICA.today_items()
+    else:
+        loop = asyncio.get_event_loop()
+        creds = await loop.run_in_executor(None, functools.partial(get_creds, user_id=interaction.user.id))
+        items = await loop.run_in_executor(None, list_today_items, creds)
 
     if not items["events"] and not items["tasks"] and not items["completed"]:
         await interaction.followup.send("No events or tasks found for today.", ephemeral=True)
@@ -135,8 +399,14 @@ async def delete(interaction: discord.Interaction, item: str):
 
     # Run all blocking operations in a thread pool
     loop = asyncio.get_event_loop()
-    creds = await loop.run_in_executor(None, get_creds)
-    items = await loop.run_in_executor(None, list_open_tasks, creds)
+    creds = await loop.run_in_executor(None, functools.partial(get_creds, user_id=interaction.user.id))
+    shared = uses_shared_account(interaction.user.id)
+    if shared and REPLICA.is_fresh(REPLICA_MAX_AGE_SECONDS):
+        items = REPLICA.open_tasks()
+    elif shared:
+        items = await loop.run_in_executor(None, get_open_tasks, creds)
+    else:
+        items = await loop.run_in_executor(None, list_open_tasks, creds)
     matches = await loop.run_in_executor(None, get_best_match, item, items)
     # RETURNS: [(index, score), ...] EX-> [(2, 68.42), (4, 55.55)]
 
@@ -197,6 +467,8 @@ async def delete(interaction: discord.Interaction, item: str):
             )
             return
         
+        if shared:
+            REPLICA.remove_task(task_id)
         await interaction2.response.send_message(
             f"Deleted: **{matched_task.get('title')}**",
             ephemeral=True
@@ -233,8 +505,14 @@ async def done(interaction: discord.Interaction, item: str):
 
     # Run all blocking operations in a thread pool
     loop = asyncio.get_event_loop()
-    creds = await loop.run_in_executor(None, get_creds)
-    items = await loop.run_in_executor(None, list_open_tasks, creds)
+    creds = await loop.run_in_executor(None, functools.partial(get_creds, user_id=interaction.user.id))
+    shared = uses_shared_account(interaction.user.id)
+    if shared and REPLICA.is_fresh(REPLICA_MAX_AGE_SECONDS):
+        items = REPLICA.open_tasks()
+    elif shared:
+        items = await loop.run_in_executor(None, get_open_tasks, creds)
+    else:
+        items = await loop.run_in_executor(None, list_open_tasks, creds)
     matches = await loop.run_in_executor(None, get_best_match, item, items)
     # RETURNS: [(index, score), ...] EX-> [(2, 68.42), (4, 55.55)]
 
@@ -295,10 +573,54 @@ async def done(interaction: discord.Interaction, item: str):
             )
             return
         
+        if shared:
+            REPLICA.mark_task_done(task_id)
         await interaction2.response.send_message(
             f"Marked as complete: **{matched_task.get('title')}**",
             ephemeral=True
         )
+
+    async def on_select_many(interaction2: discord.Interaction, selected_idxs: list[int]):
+        # Get the pending item
+        item_dict = PENDING.pop(interaction2.user.id, None)
+
+        # If there is no pending item, inform the user
+        if not item_dict:
+            await interaction2.response.send_message("No pending item found.", ephemeral=True)
+            return
+
+        # Get the selected tasks that have an ID
+        selected = [item_dict["items"][item_dict["matches"][idx][0]] for idx in selected_idxs]
+        selected = [task for task in selected if task.get("id")]
+
+        # Complete them all in one batched request
+        loop = asyncio.get_event_loop()
+        try:
+            done_func = functools.partial(done_tasks, creds, [task["id"] for task in selected])
+            results = await loop.run_in_executor(None, done_func)
+        except Exception as e:
+            await interaction2.response.send_message(
+                f"Error marking tasks as complete: {str(e)}",
+                ephemeral=True
+            )
+            return
+
+        done_titles = []
+        failed_titles = []
+        for task in selected:
+            if results.get(task["id"]):
+                if shared:
+                    REPLICA.mark_task_done(task["id"])
+                done_titles.append(task.get("title"))
+            else:
+                failed_titles.append(task.get("title"))
+
+        lines = [f"Marked {len(done_titles)} item(s) as complete:"]
+        lines += [f"- **{title}**" for title in done_titles]
+        if failed_titles:
+            lines.append(f"Failed to complete {len(failed_titles)} item(s):")
+            lines += [f"- {title}" for title in failed_titles]
+        await interaction2.response.send_message("\n".join(lines), ephemeral=True)
     
     async def on_cancel(interaction2: discord.Interaction):
         PENDING.pop(interaction2.user.id, None)
@@ -313,12 +635,12 @@ async def done(interaction: discord.Interaction, item: str):
         task = items[item_idx]
         preview_lines.append(f"{emojis[idx]} **{task.get('title')}** (Match: {score:.0f}%)")
     
-    preview_lines.append("\n**Select the item to mark as complete:**")
+    preview_lines.append("\n**Select the item to mark as complete, or pick several from the list:**")
     preview_text = "\n".join(preview_lines)
 
     await interaction.followup.send(
         preview_text,
-        view=SelectTaskView(interaction.user.id, matches, items, on_select, on_cancel),
+        view=SelectTaskView(interaction.user.id, matches, items, on_select, on_cancel, on_select_many),
         ephemeral=True
     )
 
@@ -337,8 +659,9 @@ async def add(interaction: discord.Interaction, text: str):
             await interaction2.response.send_message("No pending item found.", ephemeral=True)
             return
 
-        # Get Google API credentials
-        creds = get_creds()      
+        # Get Google API credentials, token refreshes and API calls block so keep them off the event loop
+        loop = asyncio.get_event_loop()
+        creds = await loop.run_in_executor(None, functools.partial(get_creds, user_id=interaction2.user.id))
 
         # Depending on the type, create calendar event or task
         if item_dict["type"] == "event":
@@ -350,7 +673,10 @@ async def add(interaction: discord.Interaction, text: str):
                 return
 
             # Create the appropriate item
-            link = create_calendar_event(creds, item_dict)
+            event = await loop.run_in_executor(None, insert_calendar_event, creds, item_dict)
+            if uses_shared_account(interaction2.user.id):
+                REPLICA.add_event(event)
+            link = event.get("htmlLink")
             await interaction2.response.send_message(
                 f"Added Event: **{item_dict['title'].title()}**\n{link}",
                 ephemeral=True
@@ -358,7 +684,10 @@ async def add(interaction: discord.Interaction, text: str):
 
         elif item_dict["type"] == "task":
             # Create a task
-            task_id = create_task(creds, item_dict)
+            task = await loop.run_in_executor(None, insert_task, creds, item_dict)
+            if uses_shared_account(interaction2.user.id):
+                REPLICA.add_task(task)
+            task_id = task.get("id")
             link = f"https://tasks.google.com/embed/list/@default/task/{task_id}"
             await interaction2.response.send_message(
                 f"Added task: **{item_dict['title'].title()}**\n{link}",
@@ -376,17 +705,45 @@ async def add(interaction: discord.Interaction, text: str):
         PENDING.pop(interaction2.user.id, None)
         await interaction2.response.send_message(f"Cancelled adding item.", ephemeral=True)
 
-    # Call OpenAI asynchronously to parse the text
-    # THIS IS WHERE YOU WOULD PUT `get_ollama_response` IF YOU WANT TO USE OLLAMA INSTEAD
-    openai_response = await get_openai_response(text)
+    # Preview message shown while the LLM streams, edited as fields arrive
+    preview = {"message": None, "fields": None, "task": None, "last_edit": 0.0}
+
+    async def show_preview():
+        # Best effort: a half-streamed field the embed can't render (e.g. a malformed time) must not abort /add
+        preview["last_edit"] = time.monotonic()
+        try:
+            embed = build_preview_embed(preview["fields"], partial=True)
+            if preview["message"] is None:
+                preview["message"] = await interaction.followup.send(embed=embed, ephemeral=True, wait=True)
+            else:
+                await preview["message"].edit(embed=embed)
+        except Exception as e:
+            print(f"Failed to update /add preview: {e}")
 
+    def on_fields(fields: dict):
+        # Never block the stream on Discord, and skip edits while one is in flight or too recent
+        preview["fields"] = fields
+        if preview["task"] is not None and not preview["task"].done():
+            return
+        if time.monotonic() - preview["last_edit"] < ADD_PREVIEW_EDIT_SECONDS:
+            return
+        preview["task"] = asyncio.get_event_loop().create_task(show_preview())
+
+    # Simple inputs are parsed locally, the rest goes to the LLM
     try:
-        ai_payload = json.loads(openai_response)
-    except json.JSONDecodeError:
-        await interaction.followup.send(
-            "Sorry, I couldn't parse the AI response. Please try again.",
-            ephemeral=True,
-        )
+        ai_payload = await parse_add_text(text, on_fields=on_fields)
+    except Exception as e:
+        print(f"/add parse failed: {e}")
+        ai_payload = None
+    if preview["task"] is not None:
+        await preview["task"]
+
+    if ai_payload is None:
+        error = "Sorry, I couldn't parse the AI response. Please try again."
+        if preview["message"] is not None:
+            await preview["message"].edit(content=error, embed=None)
+        else:
+            await interaction.followup.send(error, ephemeral=True)
         return
 
     # Store the AI payload for confirmation
@@ -394,59 +751,188 @@ async def add(interaction: discord.Interaction, text: str):
 
     # Build the embed structure
     embed = build_preview_embed(ai_payload)
+    view = ConfirmView(interaction.user.id, on_confirm, on_cancel)
 
-    await interaction.followup.send(
-        embed=embed,
-        view=ConfirmView(interaction.user.id, on_confirm, on_cancel),
-        ephemeral=True
-    )
+    # The streamed preview becomes the final one
+    if preview["message"] is not None:
+        await preview["message"].edit(embed=embed, view=view)
+    else:
+        await interaction.followup.send(
+            embed=embed,
+            view=view,
+            ephemeral=True
+        )
 
 # Define the /canvas_sync command
 @client.tree.command(name="canvas_sync", description="Sync Canvas assignments to Google Tasks")
-async def canvas_sync(interaction: discord.Interaction):
+@app_commands.describe(full="Re-check every course, ignoring what changed since the last sync")
+async def canvas_sync(interaction: discord.Interaction, full: bool = False):
     # Acknowledge quickly to avoid interaction timeout
     await interaction.response.defer(thinking=True, ephemeral=True)
 
+    # Message that shows live progress and then the summary
+    status = await interaction.followup.send("**Canvas Sync Starting...**", ephemeral=True, wait=True)
+    progress = {"latest": None}
+
+    async def show_progress():
+        # Edit at a fixed pace with the newest event, however fast they arrive
+        shown = None
+        while True:
+            await asyncio.sleep(SYNC_PROGRESS_EDIT_SECONDS)
+            event = progress["latest"]
+            if event is None or event is shown:
+                continue
+            shown = event
+            try:
+                await status.edit(content=format_sync_progress(event))
+            except discord.HTTPException as e:
+                print(f"Failed to update sync progress: {e}")
+
+    async def wait_for_job(job_id: int) -> str:
+        # Poll the job row, the worker stores its progress there with each heartbeat
+        loop = asyncio.get_event_loop()
+        deadline = time.monotonic() + CANVAS_SYNC_WAIT_SECONDS
+        shown = None
+        while time.monotonic() < deadline:
+            job = await loop.run_in_executor(None, SYNC_JOBS.get, job_id)
+            if job is None:
+                return "Sync job not found."
+            if job["status"] == "done":
+                return format_sync_summary(job["result"])
+            if job["status"] == "failed":
+                return f"Sync failed: {job['error']}"
+
+            if job["status"] == "queued" and job["attempts"]:
+                text = f"**Canvas Sync Retrying...** (attempt {job['attempts']} failed: {job['error']})"
+            elif job["progress"]:
+                text = format_sync_progress(job["progress"])
+            else:
+                text = f"**Canvas Sync {job['status'].capitalize()}...**"
+            if text != shown:
+                shown = text
+                try:
+                    await status.edit(content=text)
+                except discord.HTTPException as e:
+                    print(f"Failed to update sync progress: {e}")
+            await asyncio.sleep(SYNC_PROGRESS_EDIT_SECONDS)
+        return "Canvas sync is still running in the background, the next /canvas_sync will show the result."
+
     async def run_sync():
         try:
-            # Get Canvas token from environment
-            canvas_token = os.getenv("CANVAS_TOKEN")
-            canvas_api_url = os.getenv("CANVAS_BASE_URL")
-            
-            if not canvas_token or not canvas_api_url:
+            if SYNC_JOBS:
+                account = sync_account_for(interaction.user.id)
+                if account == SHARED_ACCOUNT_ID and not canvas_configured():
+                    return "Canvas API credentials not configured. Set CANVAS_TOKEN and CANVAS_BASE_URL in .env"
+                job_id = await asyncio.get_event_loop().run_in_executor(None, SYNC_JOBS.enqueue, account, full)
+                return await wait_for_job(job_id)
+
+            if not canvas_configured():
                 return "Canvas API credentials not configured. Set CANVAS_TOKEN and CANVAS_BASE_URL in .env"
-            
-            # Initialize Canvas client
-            canvas_client = CanvasClient(canvas_api_url, canvas_token)
-            
-            # Get Google credentials
-            creds = get_creds()
-            
-            # Run the sync in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            summary = await loop.run_in_executor(
-                None,
-                sync_canvas_assignments_to_google_tasks,
-                canvas_client,
-                creds
-            )
+
+            # Without the queue only the shared accounts are synced, never a linked user's own
+            if sync_account_for(interaction.user.id) != SHARED_ACCOUNT_ID:
+                return "Syncing your own accounts needs queue mode (CANVAS_SYNC_QUEUE=1), ask the bot owner to turn it on."
+
+            # Joins the sync already running (scheduled or someone else's) instead of starting another
+            updater = asyncio.get_event_loop().create_task(show_progress())
+            try:
+                summary = await CANVAS_SYNC.run(full, on_progress=lambda event: progress.update(latest=event))
+            finally:
+                updater.cancel()
             
             # Format response
-            response = (
-                f"**Canvas Sync Complete**\n\n"
-                f"Created: {summary['created']}\n"
-                f"Updated: {summary['updated']}\n"
-                f"⏭Skipped: {summary['skipped']}\n"
-                f"Errors: {summary['errors']}"
-            )
-            return response
+            return format_sync_summary(summary)
         
         except Exception as e:
             return f"Sync failed: {str(e)}"
 
-    # Run sync and send result
+    # Run sync and replace the progress message with the result
     result = await run_sync()
-    await interaction.followup.send(result, ephemeral=True)
+    try:
+        await status.edit(content=result)
+    except discord.HTTPException as e:
+        print(f"Failed to show the sync result: {e}")
+
+# Define the /link_canvas command that stores a user's own Canvas access token
+@client.tree.command(name="link_canvas", description="Sync your own Canvas account")
+@app_commands.describe(
+    token="A Canvas access token (Account -> Settings -> New Access Token)",
+    base_url="Your Canvas URL, if it isn't the bot's default"
+)
+async def link_canvas(interaction: discord.Interaction, token: str, base_url: str | None = None):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+
+    # Per-user Canvas syncs only run as queued jobs
+    if not SYNC_JOBS:
+        await interaction.followup.send(
+            "Syncing your own Canvas account needs queue mode. Set CANVAS_SYNC_QUEUE=1 in .env",
+            ephemeral=True
+        )
+        return
+
+    store = get_user_store()
+    if not store or not store.has_user(interaction.user.id):
+        await interaction.followup.send("Link your Google account with /link_google first.", ephemeral=True)
+        return
+
+    base_url = base_url or os.getenv("CANVAS_BASE_URL")
+    if not base_url:
+        await interaction.followup.send("No Canvas URL configured, pass base_url.", ephemeral=True)
+        return
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, store.set_canvas_token, interaction.user.id, base_url, token.strip())
+    await interaction.followup.send("Your Canvas account is linked. /canvas_sync now syncs it to your Google Tasks.", ephemeral=True)
+
+# Define the /link_google command that connects a user's own Google account
+@client.tree.command(name="link_google", description="Use your own Google account with the bot")
+@app_commands.describe(code="The code from the page Google redirects you to (leave empty to get the link)")
+async def link_google(interaction: discord.Interaction, code: str | None = None):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+
+    store = get_user_store()
+    if not store:
+        await interaction.followup.send(
+            "Per-user accounts are not enabled. Set CREDENTIAL_ENCRYPTION_KEY in .env",
+            ephemeral=True
+        )
+        return
+
+    loop = asyncio.get_event_loop()
+
+    # Step 1: hand out the consent link
+    if not code:
+        url = await loop.run_in_executor(None, store.start_link, interaction.user.id)
+        await interaction.followup.send(
+            f"Open this link and allow access:\n{url}\n\n"
+            "Google will redirect to a localhost page that won't load. "
+            "Copy the `code` value from its address and run `/link_google code:<code>`.",
+            ephemeral=True
+        )
+        return
+
+    # Step 2: exchange the code and store the credentials
+    try:
+        await loop.run_in_executor(None, store.finish_link, interaction.user.id, code.strip())
+    except Exception as e:
+        await interaction.followup.send(f"Linking failed: {str(e)}", ephemeral=True)
+        return
+
+    await interaction.followup.send("Your Google account is linked.", ephemeral=True)
+
+# Define the /unlink command that removes a user's own accounts
+@client.tree.command(name="unlink", description="Forget your own Google and Canvas accounts")
+async def unlink(interaction: discord.Interaction):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+
+    store = get_user_store()
+    if not store or not store.has_user(interaction.user.id):
+        await interaction.followup.send("You have no linked accounts.", ephemeral=True)
+        return
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, store.unlink, interaction.user.id)
+    await interaction.followup.send("Your accounts are unlinked, the bot uses the shared account for you again.", ephemeral=True)
 
 # Ensure we have a token before running the bot
 if not TOKEN:
@@ -1,13 +1,25 @@
 from lib.canvas_client import CanvasClient
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urljoin
+
+# Only the fields the sync actually reads, everything else is dropped while decoding
+COURSE_FIELDS = ("id", "name", "course_code")
+ASSIGNMENT_FIELDS = ("id", "name", "due_at", "updated_at", "html_url")
+PLANNER_FIELDS = ("plannable_id", "plannable_type", "plannable", "plannable_date", "course_id")
 
 def list_active_courses(canvas_client: CanvasClient) -> list[dict]:
     """List all of the current courses for the user."""
-    return canvas_client.get_paginated("/api/v1/courses", params={"enrollment_state": "active", "per_page": 100})
+    return canvas_client.get_paginated(
+        "/api/v1/courses",
+        params={"enrollment_state": "active", "per_page": 100},
+        fields=COURSE_FIELDS
+    )
 
-def filter_due_assignments(assignments: list[dict]) -> list[dict]:
-    """Filter assignments to only those that have a due date set (and are upcoming)."""
-    out = []
+def iter_due_assignments(assignments: Iterable[dict]) -> Iterator[dict]:
+    """Yield only assignments that have a due date set (and are upcoming)."""
     now = datetime.now(timezone.utc)
 
     for a in assignments:
@@ -23,13 +35,196 @@ def filter_due_assignments(assignments: list[dict]) -> list[dict]:
         except Exception:
             pass  # if parsing fails, keep it for now
 
-        out.append(a)
+        yield a
+
+def filter_due_assignments(assignments: Iterable[dict]) -> list[dict]:
+    """Filter assignments to only those that have a due date set (and are upcoming)."""
+    return list(iter_due_assignments(assignments))
 
-    return out
+def iter_course_assignments(canvas_client: CanvasClient, course_id: int) -> Iterator[dict]:
+    """Stream assignments for a specific course, page by page."""
+    return canvas_client.iter_items(
+        f"/api/v1/courses/{course_id}/assignments",
+        params={"per_page": 100},
+        fields=ASSIGNMENT_FIELDS
+    )
 
 def list_course_assignments(canvas_client: CanvasClient, course_id: int) -> list[dict]:
     """List assignments for a specific course."""
-    return canvas_client.get_paginated(
-        f"/api/v1/courses/{course_id}/assignments",
-        params={"per_page": 100}
-    )
\ No newline at end of file
+    return list(iter_course_assignments(canvas_client, course_id))
+
+
+def planner_window_start() -> str:
+    """
+    Start of the current UTC hour, as the planner's start_date. A timestamp down to
+    the microsecond would give every request a new response-cache key; within the
+    hour the URL stays the same and can be revalidated with a 304.
+    """
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return now.isoformat().replace("+00:00", "Z")
+
+
+def latest_upcoming_update(canvas_client: CanvasClient, course_id: int) -> Optional[str]:
+    """
+    Cheap change probe for a course: the newest updated_at among its upcoming
+    planner items. The planner only returns items from now on, which is exactly
+    the window the sync cares about, so it is usually a single small page.
+    """
+    now = planner_window_start()
+    latest = None
+    for item in canvas_client.iter_items(
+        "/api/v1/planner/items",
+        params={"context_codes[]": f"course_{course_id}", "start_date": now, "per_page": 100},
+        fields=("plannable",)
+    ):
+        updated_at = (item.get("plannable") or {}).get("updated_at")
+        if updated_at and (latest is None or updated_at > latest):
+            latest = updated_at
+    return latest
+
+
+# Result of fetching one course during a sync
+@dataclass
+class CourseFetch:
+    course: dict
+    assignments: list[dict] = field(default_factory=list)
+    error: Optional[Exception] = None
+    unchanged: bool = False  # True when the probe showed nothing new since the watermark
+    max_updated_at: Optional[str] = None  # Newest updated_at seen, becomes the next watermark
+
+
+def canonical_assignment(canvas_client: CanvasClient, course_id: int, assignment: dict) -> dict:
+    """
+    The same assignment shape whichever endpoint it came from: only ASSIGNMENT_FIELDS,
+    with html_url rebuilt from the ids. The planner links quizzes and discussions to
+    their own pages, so without this switching CANVAS_FETCH_MODE would change every
+    task's notes and content hash.
+    """
+    canonical = {key: assignment.get(key) for key in ASSIGNMENT_FIELDS}
+    canonical["html_url"] = urljoin(canvas_client.base_url, f"courses/{course_id}/assignments/{assignment.get('id')}")
+    return canonical
+
+
+def _fetch_course(canvas_client: CanvasClient, course: dict, watermark: Optional[str]) -> CourseFetch:
+    course_id = course.get("id")
+
+    # Skip the full assignment listing when nothing upcoming changed since the watermark
+    probe = None
+    if watermark is not None:
+        probe = latest_upcoming_update(canvas_client, course_id)
+        if probe is None or probe <= watermark:
+            return CourseFetch(course, unchanged=True, max_updated_at=watermark)
+
+    # Filter while pages stream in so past assignments are never held in memory
+    assignments = [
+        canonical_assignment(canvas_client, course_id, a)
+        for a in iter_due_assignments(iter_course_assignments(canvas_client, course_id))
+    ]
+
+    latest = max((a.get("updated_at") for a in assignments if a.get("updated_at")), default=None)
+    for candidate in (probe, watermark):
+        if candidate and (latest is None or candidate > latest):
+            latest = candidate
+
+    # "" still marks the course as synced when it has nothing upcoming yet
+    return CourseFetch(course, assignments, max_updated_at=latest or "")
+
+def fetch_due_assignments_for_courses(
+    canvas_client: CanvasClient,
+    courses: list[dict],
+    max_concurrency: int = 8,
+    watermarks: dict | None = None
+) -> Iterator[CourseFetch]:
+    """
+    Fetch upcoming, dated assignments for many courses in parallel.
+    watermarks maps course_id -> max updated_at from the last sync; courses whose
+    probe shows nothing newer are returned with unchanged=True and no assignments.
+    Yields a CourseFetch as each course finishes.
+    """
+    watermarks = watermarks or {}
+
+    # Each course is an independent paginated walk, so they can run side by side
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {
+            pool.submit(_fetch_course, canvas_client, course, watermarks.get(course.get("id"))): course
+            for course in courses
+        }
+        for future in as_completed(futures):
+            course = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                yield CourseFetch(course, error=e)
+
+
+# Planner item types that are backed by a Canvas assignment
+PLANNER_ASSIGNMENT_TYPES = ("assignment", "quiz", "discussion_topic")
+
+def planner_item_to_assignment(canvas_client: CanvasClient, item: dict) -> Optional[dict]:
+    """
+    Convert a planner item into the assignment fields the sync uses, in the
+    same shape as canonical_assignment. Returns None for items that are not
+    backed by an assignment, e.g. ungraded discussions or planner notes.
+    """
+    if item.get("plannable_type") not in PLANNER_ASSIGNMENT_TYPES:
+        return None
+
+    plannable = item.get("plannable") or {}
+
+    # Quizzes and graded discussions point at their assignment, keep mappings keyed by assignment id
+    if item.get("plannable_type") == "assignment":
+        assignment_id = item.get("plannable_id") or plannable.get("id")
+    else:
+        assignment_id = plannable.get("assignment_id")
+    if not assignment_id:
+        return None
+
+    return canonical_assignment(canvas_client, item.get("course_id"), {
+        "id": assignment_id,
+        "name": plannable.get("title"),
+        "due_at": plannable.get("due_at") or item.get("plannable_date"),
+        "updated_at": plannable.get("updated_at"),
+    })
+
+def iter_planner_assignments(canvas_client: CanvasClient, start_date: str | None = None, end_date: str | None = None) -> Iterator[tuple[int, dict]]:
+    """
+    Stream upcoming assignments across every course from the planner in one
+    paginated call. The date window is applied by Canvas. Yields (course_id, assignment).
+    """
+    if start_date is None:
+        start_date = planner_window_start()
+
+    params = {"start_date": start_date, "per_page": 100}
+    if end_date:
+        params["end_date"] = end_date
+
+    for item in canvas_client.iter_items("/api/v1/planner/items", params=params, fields=PLANNER_FIELDS):
+        assignment = planner_item_to_assignment(canvas_client, item)
+        if assignment and item.get("course_id"):
+            yield item["course_id"], assignment
+
+def fetch_due_assignments_from_planner(canvas_client: CanvasClient, courses: list[dict]) -> Iterator[CourseFetch]:
+    """
+    Planner-based alternative to fetch_due_assignments_for_courses: one stream for
+    all courses instead of one assignment listing per course. Only courses in
+    `courses` are kept, so both strategies sync the same set. Yields a CourseFetch per course.
+    """
+    by_course = {course.get("id"): CourseFetch(course, max_updated_at="") for course in courses}
+
+    try:
+        planner = iter_planner_assignments(canvas_client)
+        for course_id, assignment in planner:
+            fetched = by_course.get(course_id)
+            if not fetched:
+                continue
+            fetched.assignments.append(assignment)
+    except Exception as e:
+        # The single stream failed, so every course failed with it
+        for fetched in by_course.values():
+            yield CourseFetch(fetched.course, error=e)
+        return
+
+    for fetched in by_course.values():
+        fetched.assignments = filter_due_assignments(fetched.assignments)
+        fetched.max_updated_at = max((a["updated_at"] for a in fetched.assignments if a.get("updated_at")), default="")
+        yield fetched
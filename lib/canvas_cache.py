@@ -0,0 +1,157 @@
+"""
+SQLite-backed conditional request cache for Canvas API pages.
+Stores the ETag / Last-Modified validators with each page body so unchanged
+pages can be revalidated with a cheap 304 instead of a full download.
+"""
+
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+DEFAULT_CACHE_PATH = "canvas_cache.db"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 50 MB
+
+
+def make_cache_key(scope: str, url: str, params: dict | None = None) -> str:
+    """Build a stable cache key from the token scope, URL and sorted query params."""
+    key = f"{scope}:{url}"
+    if params:
+        key += "?" + urlencode(sorted(params.items()), doseq=True)
+    return key
+
+
+class CanvasResponseCache:
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Shared by the fetch threads, so guard every access with a lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS canvas_http_cache (
+                cache_key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                next_url TEXT,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_canvas_http_cache_last_used ON canvas_http_cache(last_used)")
+        # Running total of the body sizes, one row shared by every process using the file.
+        # Summed once when the table is created, then kept up to date by put() and _evict()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS canvas_http_cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            INSERT OR IGNORE INTO canvas_http_cache_size (id, total)
+            SELECT 0, COALESCE(SUM(size), 0) FROM canvas_http_cache
+        """)
+        self.conn.commit()
+        self._size = self._read_size()
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached entry for key, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, next_url, body FROM canvas_http_cache WHERE cache_key=?",
+                (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "next_url": row[2], "body": row[3]}
+
+    def record_hit(self, key: str):
+        """Count a 304 served from disk and bump the entry's recency."""
+        with self._lock:
+            self.hits += 1
+            self.conn.execute("UPDATE canvas_http_cache SET last_used=? WHERE cache_key=?", (time.time(), key))
+            self.conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, body: str, etag: str | None, last_modified: str | None, next_url: str | None):
+        """Store a page body with its validators, evicting old entries if over budget."""
+        # Nothing to revalidate with, so there is no point keeping it
+        if not etag and not last_modified:
+            return
+
+        size = len(body.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # Take the write lock up front so the size delta matches what is replaced
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._put(key, body, etag, last_modified, next_url, size)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _put(self, key: str, body: str, etag: str | None, last_modified: str | None, next_url: str | None, size: int):
+        old = self.conn.execute("SELECT size FROM canvas_http_cache WHERE cache_key=?", (key,)).fetchone()
+        self.conn.execute("""
+            INSERT INTO canvas_http_cache (cache_key, etag, last_modified, next_url, body, size, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+              etag=excluded.etag,
+              last_modified=excluded.last_modified,
+              next_url=excluded.next_url,
+              body=excluded.body,
+              size=excluded.size,
+              last_used=excluded.last_used
+        """, (key, etag, last_modified, next_url, body, size, time.time()))
+        self._add_size(size - (old[0] if old else 0))
+        self._evict()
+
+    def _read_size(self) -> int:
+        return self.conn.execute("SELECT total FROM canvas_http_cache_size WHERE id=0").fetchone()[0]
+
+    def _add_size(self, delta: int):
+        self.conn.execute("UPDATE canvas_http_cache_size SET total=total + ? WHERE id=0", (delta,))
+        self._size = self._read_size()
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under the size budget
+        while self._size > self.max_bytes:
+            row = self.conn.execute(
+                "SELECT cache_key, size FROM canvas_http_cache ORDER BY last_used ASC LIMIT 1"
+            ).fetchone()
+            if not row:
+                self.conn.execute("UPDATE canvas_http_cache_size SET total=0 WHERE id=0")
+                self._size = 0
+                break
+            self.conn.execute("DELETE FROM canvas_http_cache WHERE cache_key=?", (row[0],))
+            self._add_size(-row[1])
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM canvas_http_cache").fetchone()[0]
+            self._size = self._read_size()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": self._size,
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,36 +1,201 @@
 import os
+import json
+import time
+import hashlib
+import threading
 import requests
+from collections import deque
+from typing import Callable, Iterator
 from urllib.parse import urljoin
+from lib.canvas_cache import CanvasResponseCache, make_cache_key
+from lib.canvas_governor import RateLimitGovernor
+
+# ijson lets projected pages be decoded straight off the socket; fall back to r.json() without it
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# How many recent page timings to keep around for inspection
+PAGE_TIMING_HISTORY = 200
+
+# Events that finish a value in an ijson event stream
+_VALUE_END_EVENTS = {"end_map", "end_array", "string", "number", "integer", "double", "boolean", "null"}
+
+def project(item: dict, fields: tuple[str, ...]) -> dict:
+    """Keep only the given top-level keys of an item."""
+    return {k: item[k] for k in fields if k in item}
+
+def iter_projected_items(stream, fields: tuple[str, ...]):
+    """
+    Incrementally decode a JSON array of objects from a file-like stream, building
+    only the requested top-level fields of each object. Everything else (large HTML
+    descriptions, rubrics...) is skipped as parser events and never materialized.
+    """
+    wanted = set(fields)
+    item = None
+    key = None
+    builder = None
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if prefix == "item":
+            if event == "start_map":
+                item = {}
+            elif event == "end_map":
+                yield item
+                item = None
+            elif event == "map_key":
+                key = value
+                builder = ijson.ObjectBuilder() if value in wanted else None
+            continue
+
+        if builder is None:
+            continue
+
+        builder.event(event, value)
+        # The value for this key is complete once its own prefix closes or a scalar lands on it
+        if prefix == f"item.{key}" and event in _VALUE_END_EVENTS:
+            item[key] = builder.value
+            builder = None
 
 class CanvasClient:
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str, on_page: Callable[[dict], None] | None = None,
+                 cache: CanvasResponseCache | None = None, governor: RateLimitGovernor | None = None):
         self.base_url = base_url.rstrip("/") + "/"
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        self.token = token
+        # Shapes in-flight concurrency to the Canvas rate-limit bucket
+        self.governor = governor or RateLimitGovernor()
+        # Optional conditional request cache, keyed per token so users never share pages
+        self.cache = cache
+        self._cache_scope = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+        # requests.Session is not thread-safe, so each worker thread gets its own
+        self._local = threading.local()
+        # Optional hook called with each page's timing record
+        self.on_page = on_page
+        # Bounded history of per-page timings: {"url", "status", "items", "elapsed_ms"}
+        self.page_timings: deque[dict] = deque(maxlen=PAGE_TIMING_HISTORY)
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {self.token}"})
+            self._local.session = session
+        return session
 
     def _url(self, path: str) -> str:
         if path.startswith("/"):
             path = path[1:]
         return urljoin(self.base_url, path)
 
-    def get_paginated(self, path: str, params: dict | None = None) -> list[dict]:
+    def _record_page(self, url: str, status: int, items: int, elapsed: float):
+        timing = {
+            "url": url,
+            "status": status,
+            "items": items,
+            "elapsed_ms": round(elapsed * 1000, 1),
+        }
+        self.page_timings.append(timing)
+        if self.on_page:
+            self.on_page(timing)
+
+    def _get(self, url: str, params: dict | None, headers: dict, stream: bool = False) -> requests.Response:
+        """GET through the rate-limit governor, retrying with jittered backoff when throttled."""
+        for attempt in range(self.governor.max_retries + 1):
+            self.governor.acquire()
+            r = None
+            try:
+                r = self.session.get(url, params=params, headers=headers, timeout=30, stream=stream)
+            finally:
+                throttled = self.governor.release(r)
+
+            if not throttled or attempt == self.governor.max_retries:
+                return r
+
+            delay = self.governor.backoff_delay(attempt)
+            print(f"Canvas throttled request to {url}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        return r
+
+    def _decode_page(self, r: requests.Response, fields: tuple[str, ...] | None) -> list[dict]:
+        if not fields:
+            return r.json()
+        if ijson is None:
+            return [project(item, fields) for item in r.json()]
+        # Let urllib3 undo gzip so the parser sees plain JSON
+        r.raw.decode_content = True
+        return list(iter_projected_items(r.raw, fields))
+
+    def iter_pages(self, path: str, params: dict | None = None, fields: tuple[str, ...] | None = None) -> Iterator[list[dict]]:
+        """
+        Yield each page of a paginated Canvas endpoint as soon as it arrives.
+        If fields is given, only those top-level keys of each item are kept.
+        """
         url = self._url(path)
-        out: list[dict] = []
         params = params or {}
 
         while url:
-            r = self.session.get(url, params=params, timeout=30)
-            r.raise_for_status()
-            out.extend(r.json())
-
-            # Canvas pagination uses link headers
-            next_url = None
-            link = r.headers.get("Link", "")
-            for part in link.split(","):
-                if 'rel="next"' in part:
-                    next_url = part.splot(";")[0].strip()[1:-1]
-                    break
+            started = time.perf_counter()
+
+            # Revalidate with the stored validators when we have this page cached.
+            # Projected pages are cached projected, so the field list is part of the key
+            cache_key = make_cache_key(self._cache_scope, url, params)
+            if fields:
+                cache_key += "#" + ",".join(fields)
+            cached = self.cache.get(cache_key) if self.cache else None
+            headers = {}
+            if cached:
+                if cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            r = self._get(url, params, headers, stream=bool(fields))
+
+            if r.status_code == 304 and cached:
+                # Unchanged since last time, serve the body (and next link) from disk
+                self.cache.record_hit(cache_key)
+                page = json.loads(cached["body"])
+                next_url = cached["next_url"]
+            else:
+                r.raise_for_status()
+                page = self._decode_page(r, fields)
+                # Canvas pagination uses link headers, requests already parses them
+                next_url = r.links.get("next", {}).get("url")
+                if self.cache:
+                    self.cache.record_miss()
+                    body = json.dumps(page) if fields else r.text
+                    self.cache.put(cache_key, body, r.headers.get("ETag"), r.headers.get("Last-Modified"), next_url)
+
+            self._record_page(r.url, r.status_code, len(page), time.perf_counter() - started)
+
+            yield page
+
             url = next_url
             params = None # Next url already includes params
 
-        return out
\ No newline at end of file
+    def iter_items(self, path: str, params: dict | None = None, fields: tuple[str, ...] | None = None) -> Iterator[dict]:
+        """Yield items one at a time across every page, holding only one page in memory."""
+        for page in self.iter_pages(path, params, fields):
+            yield from page
+
+    def get_paginated(self, path: str, params: dict | None = None, fields: tuple[str, ...] | None = None) -> list[dict]:
+        return list(self.iter_items(path, params, fields))
+
+    def page_timing_summary(self) -> dict:
+        """Aggregate the recent page timings (count, total and slowest page)."""
+        timings = list(self.page_timings)
+        if not timings:
+            return {"pages": 0, "total_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0, "slowest_url": None}
+
+        slowest = max(timings, key=lambda t: t["elapsed_ms"])
+        total = sum(t["elapsed_ms"] for t in timings)
+        return {
+            "pages": len(timings),
+            "total_ms": round(total, 1),
+            "avg_ms": round(total / len(timings), 1),
+            "max_ms": slowest["elapsed_ms"],
+            "slowest_url": slowest["url"],
+        }
@@ -0,0 +1,127 @@
+"""
+Adaptive rate-limit governor for the Canvas API.
+Canvas meters each token with a leaky bucket and reports it through the
+X-Rate-Limit-Remaining and X-Request-Cost headers. The governor uses them to
+grow or shrink the number of in-flight requests (AIMD) and backs off with
+jitter when Canvas throttles us.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+
+def is_throttled(response) -> bool:
+    """Canvas signals throttling with a 403 'Rate Limit Exceeded' (some proxies use 429)."""
+    if response is None:
+        return False
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and "Rate Limit Exceeded" in response.text
+
+
+class RateLimitGovernor:
+    def __init__(
+        self,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        initial_concurrency: int = 4,
+        low_watermark: float = 200.0,
+        max_retries: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.low_watermark = low_watermark
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        # Current concurrency limit is fractional so additive increase can be gradual
+        self.limit = float(initial_concurrency)
+        self.in_flight = 0
+        self.remaining = None
+        self.last_cost = None
+        self.total_cost = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._recent = deque()  # (timestamp, cost) for the last minute
+
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until there is room for another in-flight request."""
+        with self._cond:
+            while self.in_flight >= max(self.min_concurrency, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, response) -> bool:
+        """Free the slot, adjust the limit from the response headers. Returns True if throttled."""
+        throttled = is_throttled(response)
+
+        with self._cond:
+            self.in_flight -= 1
+
+            if response is not None:
+                self._observe(response.headers)
+
+            if throttled:
+                # Multiplicative decrease
+                self.throttled += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            elif self.remaining is not None and self.remaining < self.low_watermark:
+                # Bucket is draining faster than it refills, ease off before Canvas cuts us off
+                self.limit = max(self.min_concurrency, self.limit * 0.75)
+            elif response is not None and response.ok:
+                # Additive increase, roughly +1 slot per window of successful requests
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+        return throttled
+
+    def _observe(self, headers):
+        self.requests += 1
+        remaining = headers.get("X-Rate-Limit-Remaining")
+        cost = headers.get("X-Request-Cost")
+        request_cost = 0.0
+        try:
+            if remaining is not None:
+                self.remaining = float(remaining)
+            if cost is not None:
+                request_cost = float(cost)
+                self.last_cost = request_cost
+                self.total_cost += request_cost
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        self._recent.append((now, request_cost))
+        while self._recent and now - self._recent[0][0] > 60:
+            self._recent.popleft()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        cap = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def metrics(self) -> dict:
+        """Snapshot of the governor's current state and rate over the last minute."""
+        with self._cond:
+            window = 60.0
+            if self._recent:
+                window = max(1.0, min(60.0, time.monotonic() - self._recent[0][0]))
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "rate_limit_remaining": self.remaining,
+                "last_request_cost": self.last_cost,
+                "total_cost": round(self.total_cost, 3),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "requests_per_sec": round(len(self._recent) / window, 2),
+                "cost_per_sec": round(sum(c for _, c in self._recent) / window, 3),
+            }
@@ -4,157 +4,365 @@ Handles syncing assignments from Canvas to Google Tasks with deduplication and u
 """
 
 import sqlite3
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime
 from lib.canvas_client import CanvasClient
-from lib.canvas_api import list_active_courses, filter_due_assignments, list_course_assignments
-from lib.sync_db import init_db, get_mapping, upsert_mapping
-from lib.google_calendar import create_task
-from googleapiclient.discovery import build
-
-
-def build_task_notes(assignment: dict, course: dict) -> str:
-    """Build notes field for Google Task from Canvas assignment and course."""
-    canvas_url = assignment.get("html_url", "")
-    course_name = course.get("name", "Unknown Course")
-    course_code = course.get("course_code", "")
-    assignment_id = assignment.get("id", "")
-    
-    notes = f"Canvas Assignment\n"
-    if course_code:
-        notes += f"Course: {course_code}\n"
-    notes += f"Course: {course_name}\n"
-    if assignment_id:
-        notes += f"Assignment ID: {assignment_id}\n"
-    if canvas_url:
-        notes += f"URL: {canvas_url}"
-    
-    return notes
-
-
-def update_google_task(creds, task_id: str, title: str, due_date: str, notes: str, tasklist_id: str = "@default") -> bool:
-    """Update an existing Google Task with new data."""
-    try:
-        service = build("tasks", "v1", credentials=creds)
-        
-        task_body = {
-            "title": title.strip().title(),
-            "notes": notes,
+from lib.canvas_api import list_active_courses, fetch_due_assignments_for_courses, fetch_due_assignments_from_planner
+from lib.canvas_transform import assignment_to_task
+from lib.sync_db import init_db, load_mappings, upsert_mappings, get_watermarks, upsert_watermarks
+from lib.sync_pipeline import Pipeline, Stage, StageWorker, FunctionWorker
+from lib.google_calendar import build_task_body, execute_tasks_batch, TASKS_BATCH_SIZE
+from lib.google_services import get_tasks_service
+
+# Courses waiting between the fetch, transform and diff stages
+COURSE_QUEUE_SIZE = 16
+
+# Writes waiting for the Google stage, enough to keep a few batches ready
+WRITE_QUEUE_SIZE = TASKS_BATCH_SIZE * 4
+
+# Send a partial batch if no new write arrives for this long
+WRITE_IDLE_FLUSH_SECONDS = 0.5
+
+
+class SyncProgress:
+    """
+    Running totals for a sync, shared by the pipeline threads. Every change is
+    reported to on_progress(event) as a plain dict; the callback runs on the
+    sync's threads, so it should only hand the event off (e.g. to an event loop).
+    """
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self.started = time.perf_counter()
+        self.counts = {
+            "courses_total": 0, "courses_done": 0, "assignments": 0,
+            "created": 0, "updated": 0, "skipped": 0, "errors": 0,
         }
-        
-        if due_date:
-            task_body["due"] = f"{due_date}T23:59:00Z"
-        
-        service.tasks().update(
-            tasklist=tasklist_id,
-            task=task_id,
-            body=task_body
-        ).execute()
-        
-        return True
-    except Exception as e:
-        print(f"Error updating Google Task {task_id}: {e}")
-        return False
+        self._lock = threading.Lock()
+
+    def add(self, phase: str = "syncing", **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+            event = self.snapshot(phase)
+        if self.on_progress:
+            try:
+                self.on_progress(event)
+            except Exception as e:
+                print(f"Sync progress callback failed: {e}")
+
+    def snapshot(self, phase: str) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "phase": phase,
+            **self.counts,
+            "elapsed_s": round(elapsed, 1),
+            "assignments_per_sec": round(self.counts["assignments"] / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+class GoogleTaskWriter:
+    """
+    Queues Google Task inserts/updates and sends them in batches of up to 50.
+    Each result is counted in the summary as it comes back from its batch, and
+    its mapping row is collected in rows for the caller to write to sync.db.
+    Not thread-safe: use one writer per thread.
+    """
+
+    def __init__(self, creds, summary: dict, synced_at: str, tasklist_id: str = "@default", batch_size: int = TASKS_BATCH_SIZE,
+                 progress: SyncProgress | None = None):
+        self.creds = creds
+        self.progress = progress
+        self.summary = summary
+        self.synced_at = synced_at
+        self.tasklist_id = tasklist_id
+        self.batch_size = batch_size
+        self.service = get_tasks_service(creds)
+        self.pending = []  # (request_id, HttpRequest) waiting for the next batch
+        self.ops = {}  # request_id -> what to record once the request completes
+        self.course_errors = defaultdict(int)
+        self.rows = []  # mapping rows waiting to be written to sync.db
+
+    def create(self, task: dict):
+        request = self.service.tasks().insert(tasklist=self.tasklist_id, body=build_task_body(task["item"]))
+        self._queue(f"create-{task['assignment_id']}", request, {"kind": "created", "google_task_id": None, "task": task})
+
+    def update(self, google_task_id: str, task: dict):
+        request = self.service.tasks().update(tasklist=self.tasklist_id, task=google_task_id, body=build_task_body(task["item"]))
+        self._queue(f"update-{task['assignment_id']}", request, {"kind": "updated", "google_task_id": google_task_id, "task": task})
+
+    def record_error(self, course_id: int):
+        self.summary["errors"] += 1
+        self.course_errors[course_id] += 1
+        if self.progress:
+            self.progress.add(errors=1)
+
+    def _queue(self, request_id: str, request, op: dict):
+        # The same assignment can show up twice (e.g. planner overrides), write it once
+        if request_id in self.ops:
+            return
+        self.pending.append((request_id, request))
+        self.ops[request_id] = op
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send everything queued so far."""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        execute_tasks_batch(self.creds, pending, self._on_result, self.batch_size)
+
+    def _on_result(self, request_id: str, response, exception):
+        op = self.ops.pop(request_id, None)
+        if op is None:
+            return
+        task = op["task"]
+
+        if exception is not None:
+            print(f"      Error writing task for assignment {task['assignment_id']}: {exception}")
+            self.record_error(task["course_id"])
+            return
+
+        google_task_id = op["google_task_id"] or response.get("id")
+        if not google_task_id:
+            print(f"      Error recording task for assignment {task['assignment_id']}: no task ID in response")
+            self.record_error(task["course_id"])
+            return
+
+        self.rows.append(mapping_row(task, google_task_id, self.synced_at))
+        self.summary[op["kind"]] += 1
+        if self.progress:
+            self.progress.add(**{op["kind"]: 1})
+        print(f"      {op['kind'].capitalize()}: {task['item']['title']}")
+
+
+def mapping_row(task: dict, google_task_id: str, synced_at: str) -> tuple:
+    """A canvas_task_map row for upsert_mappings."""
+    return (task["assignment_id"], task["course_id"], google_task_id, task["updated_at"], task["due_date"], synced_at, task["content_hash"])
+
+
+class _WriteWorker(StageWorker):
+    """Write stage: one GoogleTaskWriter per thread, partial batches go out when the stage goes idle."""
+
+    def __init__(self, creds, tasklist_id: str, synced_at: str, progress: SyncProgress):
+        self.writer = GoogleTaskWriter(creds, {"created": 0, "updated": 0, "errors": 0}, synced_at, tasklist_id, progress=progress)
+
+    def handle(self, op, emit):
+        google_task_id, task = op
+        if google_task_id:
+            self.writer.update(google_task_id, task)
+        else:
+            self.writer.create(task)
+
+    def idle(self, emit):
+        self.writer.flush()
+
+    def finish(self, emit):
+        self.writer.flush()
 
 
 def sync_canvas_assignments_to_google_tasks(
     canvas_client: CanvasClient,
     creds,
     db_path: str = "sync.db",
-    tasklist_id: str = "@default"
+    tasklist_id: str = "@default",
+    max_concurrency: int = 8,
+    full_resync: bool = False,
+    fetch_mode: str = "courses",
+    transform_workers: int = 1,
+    write_workers: int = 2,
+    on_progress=None
 ) -> dict:
     """
     Sync assignments from all Canvas courses to Google Tasks.
-    
+
+    fetch_mode picks how assignments are pulled from Canvas:
+      - "courses": one assignment listing per course, fetched in parallel up to
+        max_concurrency at a time. Courses with nothing new since their last
+        watermark are skipped unless full_resync is set.
+      - "planner": a single planner stream of upcoming items across all courses.
+
+    The sync runs as a pipeline, each stage with its own threads and a bounded
+    queue in front of it:
+      fetch (max_concurrency) -> transform (transform_workers)
+        -> diff against sync.db (1) -> Google writes (write_workers)
+    so Canvas reads and Google writes overlap. Google writes are batched, up
+    to 50 inserts/updates per HTTP round-trip.
+
+    on_progress, if given, is called with a SyncProgress event dict (phase,
+    courses_total, courses_done, assignments, created, updated, skipped,
+    errors, elapsed_s, assignments_per_sec) whenever a total changes.
+
     Returns:
         dict: Summary with keys: "created", "updated", "skipped", "errors"
     """
     summary = {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
-    
+    synced_at = datetime.utcnow().isoformat()
+    progress = SyncProgress(on_progress)
+
     # Initialize DB
     conn = init_db(db_path)
-    
+
+    # Owned by the single diff thread until the pipeline has finished
+    finished_courses = {}  # watermarks to store once the course's writes have all landed
+    course_errors = defaultdict(int)
+    unchanged_rows = []  # mapping rows to refresh without a Google call
+    seen = set()  # the same assignment can show up twice (e.g. planner overrides)
+
+    # One per write thread, merged at the end
+    write_workers_done = []
+    saved = False
+
+    def all_rows() -> list:
+        rows = list(unchanged_rows)
+        for worker in write_workers_done:
+            rows.extend(worker.writer.rows)
+        return rows
+
     try:
         # Get all active courses
         print("Fetching Canvas courses...")
         courses = list_active_courses(canvas_client)
         print(f"Found {len(courses)} active courses")
-        
-        for course in courses:
-            course_id = course.get("id")
-            course_name = course.get("name", "Unknown")
-            
-            try:
-                # Get assignments for this course
-                print(f"  Syncing {course_name}...")
-                assignments = list_course_assignments(canvas_client, course_id)
-                
-                # Filter to only assignments with due dates
-                due_assignments = filter_due_assignments(assignments)
-                print(f"    Found {len(due_assignments)} assignments with due dates")
-                
-                # Sync each assignment
-                for assignment in due_assignments:
+        progress.add(courses_total=len(courses))
+
+        # Every known mapping for these courses, in one query
+        mappings = load_mappings(conn, [course.get("id") for course in courses])
+
+        if fetch_mode == "planner":
+            # Every upcoming assignment arrives in one stream, watermarks don't apply
+            course_fetches = fetch_due_assignments_from_planner(canvas_client, courses)
+        elif fetch_mode == "courses":
+            # Per-course watermarks from the last successful sync (ignored on a full resync)
+            watermarks = None
+            if not full_resync:
+                watermarks = {course_id: max_updated_at for course_id, (max_updated_at, _) in get_watermarks(conn).items()}
+
+            # Fetch every course's assignments concurrently, handle each as it lands
+            course_fetches = fetch_due_assignments_for_courses(canvas_client, courses, max_concurrency, watermarks)
+        else:
+            raise ValueError(f"Unknown Canvas fetch mode: {fetch_mode}")
+
+        def transform(fetched, emit):
+            # Build the Google Task fields for every assignment in the course
+            tasks, failed = [], 0
+            if not fetched.error and not fetched.unchanged:
+                for assignment in fetched.assignments:
                     try:
-                        assignment_id = assignment.get("id")
-                        title = assignment.get("name", "Untitled")
-                        due_at = assignment.get("due_at")
-                        updated_at = assignment.get("updated_at")
-                        
-                        # Extract due date (YYYY-MM-DD format)
-                        try:
-                            due_dt = datetime.fromisoformat(due_at.replace("Z", "+00:00"))
-                            due_date = due_dt.strftime("%Y-%m-%d")
-                        except:
-                            due_date = None
-                        
-                        # Check if already mapped
-                        mapping = get_mapping(conn, assignment_id)
-                        
-                        if mapping:
-                            # Assignment already synced
-                            google_task_id, last_canvas_updated_at, last_due_at = mapping
-                            
-                            # Check if Canvas assignment has been updated since last sync
-                            # or if due date changed
-                            if updated_at != last_canvas_updated_at or due_date != last_due_at:
-                                # Update the Google Task
-                                notes = build_task_notes(assignment, course)
-                                success = update_google_task(creds, google_task_id, title, due_date, notes, tasklist_id)
-                                
-                                if success:
-                                    upsert_mapping(conn, assignment_id, course_id, google_task_id, updated_at, due_date)
-                                    summary["updated"] += 1
-                                    print(f"      Updated: {title}")
-                                else:
-                                    summary["errors"] += 1
-                            else:
-                                summary["skipped"] += 1
-                        else:
-                            # New assignment - create Google Task
-                            item_dict = {
-                                "title": title,
-                                "due_date": due_date,
-                                "notes": build_task_notes(assignment, course)
-                            }
-                            
-                            try:
-                                google_task_id = create_task(creds, item_dict, tasklist_id)
-                                upsert_mapping(conn, assignment_id, course_id, google_task_id, updated_at, due_date)
-                                summary["created"] += 1
-                                print(f"      Created: {title}")
-                            except Exception as e:
-                                print(f"      Error creating task: {e}")
-                                summary["errors"] += 1
-                    
+                        tasks.append(assignment_to_task(assignment, fetched.course))
                     except Exception as e:
                         print(f"    Error syncing assignment {assignment.get('id')}: {e}")
-                        summary["errors"] += 1
-            
-            except Exception as e:
-                print(f"  Error fetching assignments for {course_name}: {e}")
+                        failed += 1
+            emit((fetched, tasks, failed))
+
+        def diff(transformed, emit):
+            fetched, tasks, failed = transformed
+            course = fetched.course
+            course_id = course.get("id")
+            course_name = course.get("name", "Unknown")
+
+            if fetched.error:
+                print(f"  Error fetching assignments for {course_name}: {fetched.error}")
                 summary["errors"] += 1
-    
+                progress.add(courses_done=1, errors=1)
+                return
+
+            if fetched.unchanged:
+                print(f"  {course_name} unchanged since last sync, skipping")
+                finished_courses[course_id] = fetched.max_updated_at
+                progress.add(courses_done=1)
+                return
+
+            print(f"  Syncing {course_name}...")
+            print(f"    Found {len(fetched.assignments)} assignments with due dates")
+            summary["errors"] += failed
+            course_errors[course_id] += failed
+
+            # Queue a write for each new or changed assignment
+            skipped_before = summary["skipped"]
+            for task in tasks:
+                assignment_id = task["assignment_id"]
+                if assignment_id in seen:
+                    continue
+                seen.add(assignment_id)
+
+                # Check if already mapped
+                mapping = mappings.get(assignment_id)
+
+                if mapping:
+                    # Assignment already synced
+                    google_task_id, last_canvas_updated_at, last_due_at, last_hash = mapping
+
+                    if last_hash is None:
+                        # Synced before hashes were stored: fall back to comparing
+                        # updated_at and due date, and fill in the hash either way
+                        changed = task["updated_at"] != last_canvas_updated_at or task["due_date"] != last_due_at
+                    else:
+                        # Only what we push to Google matters, not every Canvas edit
+                        changed = task["content_hash"] != last_hash
+
+                    if changed:
+                        emit((google_task_id, task))
+                    else:
+                        summary["skipped"] += 1
+                        if last_hash is None or task["updated_at"] != last_canvas_updated_at:
+                            unchanged_rows.append(mapping_row(task, google_task_id, synced_at))
+                else:
+                    # New assignment - create Google Task
+                    emit((None, task))
+
+            finished_courses[course_id] = fetched.max_updated_at
+            progress.add(courses_done=1, assignments=len(fetched.assignments), errors=failed,
+                         skipped=summary["skipped"] - skipped_before)
+
+        def make_write_worker():
+            worker = _WriteWorker(creds, tasklist_id, synced_at, progress)
+            write_workers_done.append(worker)
+            return worker
+
+        pipeline = Pipeline([
+            Stage("transform", lambda: FunctionWorker(transform), transform_workers, COURSE_QUEUE_SIZE),
+            Stage("diff", lambda: FunctionWorker(diff), 1, COURSE_QUEUE_SIZE),
+            Stage("write", make_write_worker, write_workers, WRITE_QUEUE_SIZE, idle_timeout=WRITE_IDLE_FLUSH_SECONDS),
+        ], source_name="fetch")
+        pipeline.run(course_fetches)
+        print(f"Sync pipeline: {pipeline.stats()}")
+
+        # Fold in what the write threads did
+        for worker in write_workers_done:
+            for key in ("created", "updated", "errors"):
+                summary[key] += worker.writer.summary[key]
+            for course_id, errors in worker.writer.course_errors.items():
+                course_errors[course_id] += errors
+
+        # Only advance a course's watermark when every assignment made it across
+        watermark_rows = [
+            (course_id, max_updated_at, synced_at)
+            for course_id, max_updated_at in finished_courses.items()
+            if not course_errors[course_id]
+        ]
+
+        # Mappings and watermarks land in one transaction
+        upsert_mappings(conn, all_rows(), commit=False)
+        upsert_watermarks(conn, watermark_rows, commit=False)
+        conn.commit()
+        saved = True
+        progress.add(phase="done")
+
     finally:
+        # If the sync died part way, still record the tasks that were created so they aren't duplicated
+        if not saved:
+            upsert_mappings(conn, all_rows())
         conn.close()
-    
+
+    # Show where the Canvas time went
+    timing = canvas_client.page_timing_summary()
+    print(f"Canvas pages: {timing['pages']}, total {timing['total_ms']}ms, slowest {timing['max_ms']}ms ({timing['slowest_url']})")
+    print(f"Canvas rate limit: {canvas_client.governor.metrics()}")
+    if canvas_client.cache:
+        print(f"Canvas cache: {canvas_client.cache.stats()}")
+
     return summary
@@ -1,7 +1,70 @@
-from __future__ import annotations
+"""
+Turn Canvas assignments into the Google Task fields the sync pushes.
+No I/O here, so the sync can run it as its own pipeline stage.
+"""
+
+import hashlib
+import json
 from datetime import datetime, timezone
 from dateutil.parser import isoparse
 
+
+def build_task_notes(assignment: dict, course: dict) -> str:
+    """Build notes field for Google Task from Canvas assignment and course."""
+    canvas_url = assignment.get("html_url", "")
+    course_name = course.get("name", "Unknown Course")
+    course_code = course.get("course_code", "")
+    assignment_id = assignment.get("id", "")
+
+    notes = f"Canvas Assignment\n"
+    if course_code:
+        notes += f"Course: {course_code}\n"
+    notes += f"Course: {course_name}\n"
+    if assignment_id:
+        notes += f"Assignment ID: {assignment_id}\n"
+    if canvas_url:
+        notes += f"URL: {canvas_url}"
+
+    return notes
+
+
+def due_date_from(due_at: str | None) -> str | None:
+    """Extract due date (YYYY-MM-DD format) from a Canvas due_at timestamp."""
+    try:
+        due_dt = datetime.fromisoformat(due_at.replace("Z", "+00:00"))
+        return due_dt.strftime("%Y-%m-%d")
+    except:
+        return None
+
+
+def task_content_hash(item_dict: dict) -> str:
+    """Hash of the fields pushed to Google, so edits to anything else don't cause an update."""
+    content = json.dumps([item_dict.get("title"), item_dict.get("due_date"), item_dict.get("notes")])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def assignment_to_task(assignment: dict, course: dict) -> dict:
+    """
+    Everything the sync needs to diff and write one assignment:
+    assignment_id, course_id, item (the Google Task fields), updated_at,
+    due_date and content_hash.
+    """
+    due_date = due_date_from(assignment.get("due_at"))
+    item_dict = {
+        "title": assignment.get("name", "Untitled"),
+        "due_date": due_date,
+        "notes": build_task_notes(assignment, course)
+    }
+    return {
+        "assignment_id": assignment.get("id"),
+        "course_id": course.get("id"),
+        "item": item_dict,
+        "updated_at": assignment.get("updated_at"),
+        "due_date": due_date,
+        "content_hash": task_content_hash(item_dict),
+    }
+
+
 def canvas_assignment_to_task_payload(
     assignment: dict,
     course: dict,
@@ -66,4 +129,4 @@ def canvas_assignment_to_task_payload(
         payload["assumptions"].append("due_time_from_canvas")
         payload["notes"] = (payload["notes"] or "") + f"\ncanvas_due_rfc3339: {due_rfc3339}"
 
-    return payload
\ No newline at end of file
+    return payload
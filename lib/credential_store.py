@@ -0,0 +1,253 @@
+"""
+Per-Discord-user Google credential store.
+Each user's authorized-user info lives in SQLite with the refresh token
+encrypted (Fernet, key from CREDENTIAL_ENCRYPTION_KEY), next to their
+encrypted Canvas access token if they linked one. Live Credentials are
+kept in a bounded LRU of CredentialManagers; one background thread refreshes
+the ones close to expiry and evicts users who have been idle too long.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from cryptography.fernet import Fernet
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from lib.google_auth import CredentialManager, SCOPES, REFRESH_CHECK_SECONDS
+
+DEFAULT_STORE_PATH = "credentials.db"
+
+# Most live Credentials kept in memory at once
+DEFAULT_MAX_LIVE = 256
+
+# Users with no command for this long are dropped from memory
+DEFAULT_IDLE_SECONDS = 30 * 60
+
+# Desktop OAuth clients redirect here; the user pastes the code back to the bot
+LINK_REDIRECT_URI = "http://localhost"
+
+
+class UserCredentialStore:
+    def __init__(self, encryption_key: str, db_path: str = DEFAULT_STORE_PATH,
+                 credentials_path: str = "credentials.json",
+                 max_live: int = DEFAULT_MAX_LIVE, idle_seconds: int = DEFAULT_IDLE_SECONDS):
+        self.fernet = Fernet(encryption_key)
+        self.credentials_path = credentials_path
+        self.max_live = max_live
+        self.idle_seconds = idle_seconds
+
+        self._lock = threading.Lock()
+        self._live: OrderedDict[int, tuple[CredentialManager, float]] = OrderedDict()
+        self._pending_links: dict[int, InstalledAppFlow] = {}
+        self._versions: dict[int, str] = {}  # updated_at of each user's row as this process last saw it
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_credentials (
+                discord_user_id INTEGER PRIMARY KEY,
+                info TEXT NOT NULL,
+                refresh_token_enc BLOB NOT NULL,
+                updated_at TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_canvas (
+                discord_user_id INTEGER PRIMARY KEY,
+                base_url TEXT NOT NULL,
+                token_enc BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        # Which users have linked an account, so unlinked users never touch the disk
+        for user_id, updated_at in self.conn.execute("SELECT discord_user_id, updated_at FROM user_credentials"):
+            self._versions[user_id] = updated_at
+        self._linked = set(self._versions)
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self._linked
+
+    def reload_user(self, user_id: int):
+        """
+        Re-read a user's row. Other processes (the sync workers) don't see links made
+        through the bot, so they call this before using a user's accounts; cached
+        credentials are dropped when the row changed, e.g. after a re-link.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT updated_at FROM user_credentials WHERE discord_user_id=?", (user_id,)
+            ).fetchone()
+            if row is None:
+                self._linked.discard(user_id)
+                self._versions.pop(user_id, None)
+                self._live.pop(user_id, None)
+                return
+            self._linked.add(user_id)
+            if self._versions.get(user_id) != row[0]:
+                self._versions[user_id] = row[0]
+                self._live.pop(user_id, None)
+
+    def linked_users(self) -> list[int]:
+        return sorted(self._linked)
+
+    def canvas_users(self) -> list[int]:
+        """Users who linked both a Google and a Canvas account."""
+        with self._lock:
+            rows = self.conn.execute("SELECT discord_user_id FROM user_canvas").fetchall()
+        return sorted(row[0] for row in rows if row[0] in self._linked)
+
+    def get(self, user_id: int) -> Credentials | None:
+        """Valid credentials for a linked user, or None if they haven't linked an account."""
+        if user_id not in self._linked:
+            return None
+
+        with self._lock:
+            entry = self._live.get(user_id)
+            if entry is None:
+                manager = CredentialManager(
+                    loader=lambda: self._load(user_id),
+                    saver=lambda creds: self._save(user_id, creds)
+                )
+            else:
+                manager = entry[0]
+            # Most recently used goes to the end of the LRU
+            self._live[user_id] = (manager, time.monotonic())
+            self._live.move_to_end(user_id)
+            while len(self._live) > self.max_live:
+                self._live.popitem(last=False)
+
+        return manager.get()
+
+    def _load(self, user_id: int) -> Credentials | None:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT info, refresh_token_enc FROM user_credentials WHERE discord_user_id=?",
+                (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+
+        info = json.loads(row[0])
+        info["refresh_token"] = self.fernet.decrypt(row[1]).decode("utf-8")
+        return Credentials.from_authorized_user_info(info, SCOPES)
+
+    def _save(self, user_id: int, creds: Credentials):
+        info = json.loads(creds.to_json())
+        refresh_token = info.pop("refresh_token", None) or creds.refresh_token
+        if not refresh_token:
+            raise ValueError("Google did not return a refresh token, cannot store these credentials.")
+
+        updated_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO user_credentials (discord_user_id, info, refresh_token_enc, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(discord_user_id) DO UPDATE SET
+                  info=excluded.info,
+                  refresh_token_enc=excluded.refresh_token_enc,
+                  updated_at=excluded.updated_at
+            """, (user_id, json.dumps(info), self.fernet.encrypt(refresh_token.encode("utf-8")), updated_at))
+            self.conn.commit()
+            self._linked.add(user_id)
+            self._versions[user_id] = updated_at
+
+    def start_link(self, user_id: int) -> str:
+        """Begin linking a user's Google account. Returns the URL they should open."""
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES, redirect_uri=LINK_REDIRECT_URI)
+        url, _ = flow.authorization_url(access_type="offline", prompt="consent")
+        with self._lock:
+            self._pending_links[user_id] = flow
+        return url
+
+    def finish_link(self, user_id: int, code: str):
+        """Finish linking with the code from the redirect URL. Blocking, run it off the event loop."""
+        with self._lock:
+            flow = self._pending_links.pop(user_id, None)
+        if flow is None:
+            raise ValueError("No link in progress, start again with /link_google.")
+
+        flow.fetch_token(code=code)
+        self._save(user_id, flow.credentials)
+
+        # Drop any cached credentials so the new ones are picked up
+        with self._lock:
+            self._live.pop(user_id, None)
+
+    def set_canvas_token(self, user_id: int, base_url: str, token: str):
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO user_canvas (discord_user_id, base_url, token_enc) VALUES (?, ?, ?)
+                ON CONFLICT(discord_user_id) DO UPDATE SET base_url=excluded.base_url, token_enc=excluded.token_enc
+            """, (user_id, base_url, self.fernet.encrypt(token.encode("utf-8"))))
+            self.conn.commit()
+
+    def get_canvas_token(self, user_id: int) -> tuple[str, str] | None:
+        """(base_url, token) for a user's own Canvas account, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT base_url, token_enc FROM user_canvas WHERE discord_user_id=?", (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], self.fernet.decrypt(row[1]).decode("utf-8")
+
+    def unlink(self, user_id: int):
+        with self._lock:
+            self.conn.execute("DELETE FROM user_canvas WHERE discord_user_id=?", (user_id,))
+            self.conn.execute("DELETE FROM user_credentials WHERE discord_user_id=?", (user_id,))
+            self.conn.commit()
+            self._linked.discard(user_id)
+            self._versions.pop(user_id, None)
+            self._live.pop(user_id, None)
+
+    def sweep(self):
+        """Refresh live credentials close to expiry and evict idle users."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [uid for uid, (_, last_used) in self._live.items() if now - last_used > self.idle_seconds]
+            for uid in idle:
+                del self._live[uid]
+            managers = [manager for manager, _ in self._live.values()]
+
+        for manager in managers:
+            try:
+                manager.refresh_if_due()
+            except Exception as e:
+                print(f"Background credential refresh failed: {e}")
+
+    def start_background_refresh(self, interval: int = REFRESH_CHECK_SECONDS):
+        """Start one daemon thread that sweeps every live user's credentials."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.sweep()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="user-creds-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_user_store() -> UserCredentialStore | None:
+    """The process-wide store, or None when CREDENTIAL_ENCRYPTION_KEY isn't set (single-user mode)."""
+    global _STORE
+    key = os.getenv("CREDENTIAL_ENCRYPTION_KEY")
+    if not key:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = UserCredentialStore(key)
+        return _STORE
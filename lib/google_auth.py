@@ -1,4 +1,8 @@
 import os
+import json
+import tempfile
+import threading
+from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -9,35 +13,160 @@ SCOPES = [
     "https://www.googleapis.com/auth/tasks"
 ]
 
+# Refresh this long before the access token expires
+REFRESH_MARGIN_SECONDS = 300
+
+# How often the background refresher checks the expiry
+REFRESH_CHECK_SECONDS = 60
+
 
 """
-Get Google API credentials, handling OAuth flow and token storage.
+Write a file atomically: write a temp file next to it, then rename over it.
+The temp name is unique, the bot and every sync worker may save token.json at once.
 """
-def get_creds(credentials_path: str = "credentials.json",
-              token_path: str = "token.json",):
-    creds = None
+def _atomic_write(path: str, content: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CredentialManager:
+    """
+    Keeps Google credentials in memory for the whole process.
+    token.json is read once, and a background thread refreshes the access token
+    shortly before it expires, so commands never wait on disk or on a refresh.
+    """
+
+    def __init__(self, credentials_path: str = "credentials.json", token_path: str = "token.json",
+                 refresh_margin: int = REFRESH_MARGIN_SECONDS, loader=None, saver=None):
+        self.credentials_path = credentials_path
+        self.token_path = token_path
+        self.refresh_margin = refresh_margin
+        # Where credentials come from and go to, token.json unless told otherwise
+        self._loader = loader or self._load
+        self._saver = saver or (lambda creds: _atomic_write(self.token_path, creds.to_json()))
+        self._creds = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
 
-    # Load existing token if available
-    if os.path.exists(token_path):
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    def get(self) -> Credentials | None:
+        """Return valid credentials, loading or refreshing them only if nothing usable is in memory."""
+        creds = self._creds
+        if creds is not None and creds.valid:
+            return creds
 
-    # If no valid credentials, initiate the OAuth flow
-    if not creds or not creds.valid:
+        # Only one caller loads/refreshes, the rest wait and reuse its result
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._loader()
+                if self._creds is None:
+                    return None
+            if not self._creds.valid:
+                self._refresh_locked()
+            return self._creds
 
-        # If credentials are expired but have a refresh token, refresh them
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        # Otherwise, start a new OAuth flow to get credentials
-        else:
+    def _load(self) -> Credentials:
+        creds = None
+
+        # Load existing token if available
+        if os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+
+        # With no usable token (or no way to refresh it), start a new OAuth flow
+        if not creds or (not creds.valid and not (creds.expired and creds.refresh_token)):
             flow = InstalledAppFlow.from_client_secrets_file(
-                credentials_path, SCOPES)
-            
+                self.credentials_path, SCOPES)
+
             # Run the flow to get credentials (HEADLESS FOR NOW)
             # if not headless: flow.run_local_server(port=0)
             creds = flow.run_local_server(port=0)
 
-            # Save the credentials for future use   
-            with open(token_path, "w") as f:
-                f.write(creds.to_json())
-    
-    return creds
+            # Save the credentials for future use
+            _atomic_write(self.token_path, creds.to_json())
+
+        return creds
+
+    def _refresh_locked(self):
+        # Refresh a copy and swap it in, so requests already using the old object see a consistent token
+        fresh = Credentials.from_authorized_user_info(json.loads(self._creds.to_json()), SCOPES)
+        fresh.refresh(Request())
+        self._saver(fresh)
+        self._creds = fresh
+
+    def refresh_if_due(self) -> bool:
+        """Refresh if the token expires within the margin. Returns True if it refreshed."""
+        with self._lock:
+            creds = self._creds
+            if creds is None or not creds.refresh_token:
+                return False
+            if creds.expiry is not None:
+                # google-auth keeps expiry as naive UTC
+                remaining = (creds.expiry - datetime.utcnow()).total_seconds()
+                if remaining > self.refresh_margin:
+                    return False
+            self._refresh_locked()
+            return True
+
+    def start_background_refresh(self, interval: int = REFRESH_CHECK_SECONDS):
+        """Start a daemon thread that keeps the access token fresh."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh_if_due()
+                except Exception as e:
+                    print(f"Background credential refresh failed: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="google-creds-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# One manager per token file, shared by the whole process
+_MANAGERS: dict[str, CredentialManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+def get_credential_manager(credentials_path: str = "credentials.json",
+                           token_path: str = "token.json") -> CredentialManager:
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(token_path)
+        if manager is None:
+            manager = _MANAGERS[token_path] = CredentialManager(credentials_path, token_path)
+        return manager
+
+
+"""
+Get Google API credentials, handling OAuth flow and token storage.
+Served from memory after the first call; see CredentialManager.
+If user_id (a Discord user ID) is given and that user linked their own Google
+account, their credentials are returned; otherwise the shared token.json ones.
+"""
+def get_creds(credentials_path: str = "credentials.json",
+              token_path: str = "token.json",
+              user_id: int | None = None):
+    if user_id is not None:
+        # Imported here, credential_store builds on CredentialManager
+        from lib.credential_store import get_user_store
+        store = get_user_store()
+        if store:
+            creds = store.get(user_id)
+            if creds is not None:
+                return creds
+
+    return get_credential_manager(credentials_path, token_path).get()
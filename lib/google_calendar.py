@@ -1,14 +1,34 @@
-from googleapiclient.discovery import build
+from lib.google_services import get_calendar_service, get_tasks_service
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+# Timezone used to decide what "today" means
+LOCAL_TZ = ZoneInfo("America/Los_Angeles")
+
+# Google accepts at most 50 calls in one Tasks batch request
+TASKS_BATCH_SIZE = 50
+
+# Partial response mask for task listings, only the fields we actually read
+TASK_LIST_FIELDS = "nextPageToken,items(id,title,due,notes,updated,status,deleted,hidden,completed)"
+
+# Partial response mask for event listings, what /list and the replica read
+EVENT_LIST_FIELDS = "nextPageToken,nextSyncToken,items(id,status,summary,location,start,end,htmlLink)"
+
+# Small shared pool for fetching Calendar and Tasks side by side
+_FANOUT = ThreadPoolExecutor(max_workers=4, thread_name_prefix="google-fanout")
+
+# How far before the fetch start an updatedMin snapshot is stamped, to cover clock skew
+SNAPSHOT_SKEW_SECONDS = 60
+
 """
 Function to create an event in the google calendar from the item dictionary.
+Returns the created event resource.
 """
-def create_calendar_event(creds, item: dict, calendar_id: str = "primary"):
+def insert_calendar_event(creds, item: dict, calendar_id: str = "primary") -> dict:
 
-    # Build the Google Calendar service
-    service = build("calendar", "v3", credentials=creds)
+    # Get the cached Google Calendar service
+    service = get_calendar_service(creds)
 
     # Create the event body based on the item dictionary
     event = {
@@ -20,19 +40,22 @@ def create_calendar_event(creds, item: dict, calendar_id: str = "primary"):
     }
 
     # Insert the event into the calendar
-    created = service.events().insert(calendarId=calendar_id, body=event).execute()
+    return service.events().insert(calendarId=calendar_id, body=event).execute()
+
+
+"""
+Function to create an event in the google calendar and return its link.
+"""
+def create_calendar_event(creds, item: dict, calendar_id: str = "primary"):
 
     # Return the link to the created event
-    return created.get('htmlLink')
+    return insert_calendar_event(creds, item, calendar_id).get('htmlLink')
 
 
 """
-Function to create a google task from the item dictionary.
+Function to build a google task body from the item dictionary.
 """
-def create_task(creds, item: dict, tasklist_id: str = "@default") -> str:
-
-    # Build the Google Tasks service
-    service = build("tasks", "v1", credentials=creds)
+def build_task_body(item: dict) -> dict:
 
     # Create the task body based on item dictionary
     task = {
@@ -44,79 +67,81 @@ def create_task(creds, item: dict, tasklist_id: str = "@default") -> str:
     if item.get("due_date"):
         task["due"] = f"{item['due_date']}T23:59:00Z"
 
+    return task
+
+
+"""
+Function to create a google task from the item dictionary.
+Returns the created task resource.
+"""
+def insert_task(creds, item: dict, tasklist_id: str = "@default") -> dict:
+
+    # Get the cached Google Tasks service
+    service = get_tasks_service(creds)
+
     # Create the task in the list
-    created = service.tasks().insert(tasklist=tasklist_id, body=task).execute()
+    return service.tasks().insert(tasklist=tasklist_id, body=build_task_body(item)).execute()
+
+
+"""
+Function to create a google task and return its ID.
+"""
+def create_task(creds, item: dict, tasklist_id: str = "@default") -> str:
 
     # Return the task ID
-    return created.get('id')
+    return insert_task(creds, item, tasklist_id).get('id')
 
 """
-Function to list all of the current task and events on the users calendar for current day.
+Function to run many Tasks API requests as batched HTTP calls (max 50 per batch).
+requests is a list of (request_id, HttpRequest). callback(request_id, response, exception)
+is called once per request, including when a whole batch fails to send.
 """
+def execute_tasks_batch(creds, requests: list, callback, batch_size: int = TASKS_BATCH_SIZE):
 
-def list_today_items(creds, calendar_id: str = "primary", tasklist_id: str = "@default") -> dict:
+    # Get the cached Google Tasks service
+    service = get_tasks_service(creds)
 
-    # Default completed array set to nothing
-    completed = []
+    for start in range(0, len(requests), batch_size):
+        chunk = requests[start:start + batch_size]
+        batch = service.new_batch_http_request(callback=callback)
+        for request_id, request in chunk:
+            batch.add(request, request_id=request_id)
 
-    # Build the Google Calendar and Tasks services
-    service = build("calendar", "v3", credentials=creds)
-    tasks_service = build("tasks", "v1", credentials=creds)
+        try:
+            batch.execute()
+        except Exception as e:
+            # The batch itself failed, report it against every request in it
+            print(f"Error executing Google Tasks batch: {e}")
+            for request_id, _ in chunk:
+                callback(request_id, None, e)
+
+"""
+Function to get today's local date and its start/end as UTC RFC3339 strings.
+"""
+def today_bounds() -> tuple:
+    now_local = datetime.now(LOCAL_TZ)
+    date = now_local.date()
+    start_of_day = datetime.combine(date, datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(ZoneInfo("UTC")).isoformat().replace('+00:00', 'Z')
+    end_of_day = datetime.combine(date, datetime.max.time(), tzinfo=LOCAL_TZ).astimezone(ZoneInfo("UTC")).isoformat().replace('+00:00', 'Z')
+    return date, start_of_day, end_of_day
+
+"""
+Function to list all of the current task and events on the users calendar for current day.
+"""
+
+def list_today_items(creds, calendar_id: str = "primary", tasklist_id: str = "@default") -> dict:
 
     # Define the time range for today using Pacific timezone
-    pacific = ZoneInfo("America/Los_Angeles")
-    now_pacific = datetime.now(pacific)
-    date = now_pacific.date()
-    start_of_day = datetime.combine(date, datetime.min.time(), tzinfo=pacific).astimezone(ZoneInfo("UTC")).isoformat().replace('+00:00', 'Z')
-    end_of_day = datetime.combine(date, datetime.max.time(), tzinfo=pacific).astimezone(ZoneInfo("UTC")).isoformat().replace('+00:00', 'Z')
-
-    # Fetch today's events from Google Calendar
-    events_result = service.events().list(
-        calendarId=calendar_id,
-        timeMin=start_of_day,
-        timeMax=end_of_day,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    events = events_result.get('items', [])
-
-    # Fetch today's tasks from Google Tasks
-    tomorrow = date + timedelta(days=1)
-    
-    # Fetch all tasks (completed and hidden included)
-    tasks_result = tasks_service.tasks().list(
-        tasklist=tasklist_id,
-        showCompleted=True,
-        showHidden=True
-    ).execute()
+    date, start_of_day, end_of_day = today_bounds()
+
+    # Fetch Calendar and Tasks at the same time, each on its own thread/service
+    events_future = _FANOUT.submit(_list_events_between, creds, calendar_id, start_of_day, end_of_day)
+    tasks_future = _FANOUT.submit(_list_tasks_due_on, creds, tasklist_id, date)
+    events = events_future.result()
+    tasks = tasks_future.result()
 
-    tasks = tasks_result.get('items', [])
-    
-    # Separate completed and incomplete tasks, filtering by today's date
-    incomplete_tasks = []
-    for task in tasks:
-        # Check if task is due today
-        task_due = task.get('due')
-        is_today = False
-        if task_due:
-            try:
-                # Parse the due date and check if it's today
-                task_date = datetime.fromisoformat(task_due.replace('Z', '+00:00')).date()
-                is_today = task_date == date
-            except:
-                pass
-        
-        # Only include tasks due today
-        if is_today:
-            if task.get("status") == "completed":
-                completed.append(task)
-            else:
-                incomplete_tasks.append(task)
-    
-    tasks = incomplete_tasks
-    
     # Separate completed and incomplete tasks
+    completed = []
     incomplete_tasks = []
     for task in tasks:
         if task.get("status") == "completed":
@@ -124,57 +149,173 @@ def list_today_items(creds, calendar_id: str = "primary", tasklist_id: str = "@d
         else:
             incomplete_tasks.append(task)
     
-    tasks = incomplete_tasks
-    
     # Return the events and tasks for the day
     return {
         "events": events,
-        "tasks": tasks,
+        "tasks": incomplete_tasks,
         "completed": completed
     }
 
 
+"""
+Function to list the calendar events between two RFC3339 times, across all pages.
+"""
+def _list_events_between(creds, calendar_id: str, time_min: str, time_max: str) -> list[dict]:
+
+    # Get the cached Google Calendar service
+    service = get_calendar_service(creds)
+
+    events = []
+    page_token = None
+    while True:
+        events_result = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True,
+            orderBy='startTime',
+            pageToken=page_token,
+            fields=EVENT_LIST_FIELDS
+        ).execute()
+
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+"""
+Function to list the tasks (completed and hidden included) due on a given date.
+Task due dates are date-only, stored as midnight UTC, so the window is that UTC day.
+"""
+def _list_tasks_due_on(creds, tasklist_id: str, date) -> list[dict]:
+
+    # Get the cached Google Tasks service
+    service = get_tasks_service(creds)
+
+    # Let Google do the date filtering instead of downloading the whole list
+    return list(iter_tasks(
+        service,
+        tasklist_id,
+        showCompleted=True,
+        showHidden=True,
+        dueMin=f"{date.isoformat()}T00:00:00.000Z",
+        dueMax=f"{(date + timedelta(days=1)).isoformat()}T00:00:00.000Z"
+    ))
+
+
+"""
+Function to page through every task in a list, following nextPageToken.
+Extra keyword arguments are passed straight to tasks().list.
+"""
+def iter_tasks(service, tasklist_id: str = "@default", fields: str = TASK_LIST_FIELDS, max_results: int = 100, **params):
+
+    page_token = None
+    while True:
+        response = service.tasks().list(
+            tasklist=tasklist_id,
+            maxResults=max_results,
+            pageToken=page_token,
+            fields=fields,
+            **params
+        ).execute()
+
+        yield from response.get("items", [])
+
+        # Stop when there are no more pages
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+
+"""
+Function to normalize a task to the id/title/due/notes/updated shape the bot uses.
+"""
+def normalize_task(item: dict) -> dict:
+    return {
+        "id": item.get("id"),
+        "title": item.get("title"),
+        "due": item.get("due"),
+        "notes": item.get("notes"),
+        "updated": item.get("updated"),
+    }
+
+
 """
 Function to return open (not completed) tasks from the given task list.
 Each item includes id/title/due/notes/updated (when available).
+All pages are fetched; max_results is the page size (Google caps it at 100).
 """
 def list_open_tasks(creds, tasklist_id: str = "@default", max_results: int = 100) -> list[dict]:
 
-    # Build the google tasks service
-    service = build("tasks", "v1", credentials=creds)
+    # Get the cached google tasks service
+    service = get_tasks_service(creds)
 
-    # Get the response from the tasks list API
-    response = service.tasks().list(
-        tasklist=tasklist_id,
+    # Walk every page of open tasks, only asking for the fields we keep
+    items = iter_tasks(
+        service,
+        tasklist_id,
+        max_results=max_results,
         showCompleted=False,
-        showHidden=False,
-        maxResults=max_results
-    ).execute()
-
-    # List of the items returned
-    items = response.get("items", [])
-
-    # Normalize to have consistent structure
-    tasks = []
-    for item in items:
-        tasks.append({
-            "id": item.get("id"),
-            "title": item.get("title"),
-            "due": item.get("due"),
-            "notes": item.get("notes"),
-            "updated": item.get("updated"),
-        })
+        showHidden=False
+    )
 
     # Return the list of open tasks
-    return tasks
+    return [normalize_task(item) for item in items]
+
+
+"""
+Function to refresh a snapshot of open tasks, only transferring what changed.
+A snapshot is {"tasks": {task_id: task}, "synced_at": RFC3339}. With no snapshot
+a full listing is done; otherwise only tasks updated since synced_at are fetched
+(including completed/deleted ones, so they can be dropped) and merged in.
+Returns the new snapshot, the one passed in is left untouched.
+"""
+def refresh_open_tasks(creds, snapshot: dict | None = None, tasklist_id: str = "@default") -> dict:
+
+    # Stamp the fetch start, backed off a little to cover clock skew with Google
+    synced_at = (datetime.now(ZoneInfo("UTC")) - timedelta(seconds=SNAPSHOT_SKEW_SECONDS)).isoformat().replace("+00:00", "Z")
+
+    if not snapshot:
+        tasks = {task["id"]: task for task in list_open_tasks(creds, tasklist_id)}
+        return {"tasks": tasks, "synced_at": synced_at}
+
+    # Get the cached google tasks service
+    service = get_tasks_service(creds)
+
+    tasks = dict(snapshot["tasks"])
+    changes = iter_tasks(
+        service,
+        tasklist_id,
+        updatedMin=snapshot["synced_at"],
+        showCompleted=True,
+        showHidden=True,
+        showDeleted=True
+    )
+
+    # Merge the changes: open tasks are added/replaced, anything else is dropped
+    for item in changes:
+        if item.get("deleted") or item.get("status") != "needsAction":
+            tasks.pop(item.get("id"), None)
+        else:
+            tasks[item["id"]] = normalize_task(item)
+
+    return {"tasks": tasks, "synced_at": synced_at}
+
+
+"""
+Function to turn a snapshot from refresh_open_tasks back into a list of tasks.
+"""
+def snapshot_tasks(snapshot: dict) -> list[dict]:
+    return list(snapshot["tasks"].values())
 
 """
 Function to delete a task by its ID. Returns TRUE if successful.
 """
 def delete_task(creds, task_id: str, tasklist_id: str = "@default") -> bool:
     try:
-        # Build the google task service
-        service = build("tasks", "v1", credentials=creds)
+        # Get the cached google task service
+        service = get_tasks_service(creds)
 
         # Delete the task
         service.tasks().delete(
@@ -194,25 +335,43 @@ Function to mark a task as complete by its ID. Returns TRUE if successful.
 def done_task(creds, task_id: str, tasklist_id: str = "@default") -> bool:
 
     try:
-        # Build the Google Tasks service
-        service = build("tasks", "v1", credentials=creds)
+        # Get the cached Google Tasks service
+        service = get_tasks_service(creds)
 
-        # First, get the task to ensure it exists and get its full data
-        task = service.tasks().get(
-            tasklist=tasklist_id,
-            task=task_id
-        ).execute()
-
-        # Update the task with completed status
-        task["status"] = "completed"
-        service.tasks().update(
+        # Patch only the status, one round-trip and no need to resend the task
+        service.tasks().patch(
             tasklist=tasklist_id,
             task=task_id,
-            body=task
+            body={"status": "completed"}
         ).execute()
 
         return True
 
     except Exception as e:
         print(f"Error marking task {task_id} as complete: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+"""
+Function to mark many tasks as complete in batched requests.
+Returns {task_id: True/False} for every task ID passed in.
+"""
+def done_tasks(creds, task_ids: list[str], tasklist_id: str = "@default") -> dict:
+
+    # Get the cached Google Tasks service
+    service = get_tasks_service(creds)
+
+    results = {task_id: False for task_id in task_ids}
+
+    def on_result(request_id, response, exception):
+        if exception is not None:
+            print(f"Error marking task {request_id} as complete: {exception}")
+            return
+        results[request_id] = True
+
+    requests = [
+        (task_id, service.tasks().patch(tasklist=tasklist_id, task=task_id, body={"status": "completed"}))
+        for task_id in results
+    ]
+    execute_tasks_batch(creds, requests, on_result)
+
+    return results
@@ -0,0 +1,69 @@
+"""
+Cached Google API service objects.
+build() reads and parses the discovery document on every call. Here each
+document is loaded once from the copy bundled with googleapiclient, and each
+thread keeps its own service objects because httplib2 is not thread-safe.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+# Parsed discovery documents, shared by every thread
+_DOCS: dict[tuple[str, str], dict] = {}
+_DOCS_LOCK = threading.Lock()
+
+# Executor threads serve many users' credentials in turn, so each keeps a
+# service per recently seen user rather than only the last one
+SERVICES_PER_THREAD = 32
+
+# Per-thread LRU {(api, version, id(creds)): (creds, service)}
+_local = threading.local()
+
+
+def _discovery_doc(api: str, version: str) -> dict:
+    key = (api, version)
+    with _DOCS_LOCK:
+        doc = _DOCS.get(key)
+        if doc is None:
+            raw = get_static_doc(api, version)
+            if raw is None:
+                raise ValueError(f"No bundled discovery document for {api} {version}")
+            doc = json.loads(raw)
+            _DOCS[key] = doc
+    return doc
+
+
+def get_service(api: str, version: str, creds):
+    """
+    Return this thread's service object for api/version and these credentials,
+    building it on first use. A new credentials object (e.g. after re-auth) gets
+    its own service, so it never keeps authorizing with stale credentials.
+    """
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = OrderedDict()
+
+    # The entry holds a reference to creds, so its id can't be reused while cached
+    key = (api, version, id(creds))
+    cached = services.get(key)
+    if cached and cached[0] is creds:
+        services.move_to_end(key)
+        return cached[1]
+
+    service = build_from_document(_discovery_doc(api, version), credentials=creds)
+    services[key] = (creds, service)
+    services.move_to_end(key)
+    while len(services) > SERVICES_PER_THREAD:
+        services.popitem(last=False)
+    return service
+
+
+def get_tasks_service(creds):
+    return get_service("tasks", "v1", creds)
+
+
+def get_calendar_service(creds):
+    return get_service("calendar", "v3", creds)
@@ -0,0 +1,73 @@
+"""
+Incremental parser for the flat JSON object the LLM streams back for /add.
+Text is fed in as it arrives and every top-level field is reported as soon as
+its value is complete, so a preview can show the type and title while the rest
+of the object is still being generated.
+"""
+
+import json
+
+_WHITESPACE = " \t\r\n"
+# A number is only known to be complete once something follows it
+_VALUE_END = ",}" + _WHITESPACE
+
+
+class IncrementalJSONObjectParser:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = None  # Index just past the last complete field, None until the opening brace
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str) -> dict:
+        """Add streamed text. Returns the fields completed by this chunk (possibly none)."""
+        self.buffer += chunk
+        new_fields = {}
+        if self.done:
+            return new_fields
+
+        if self._pos is None:
+            # Models sometimes wrap the object in prose or a code fence, start at the brace
+            start = self.buffer.find("{")
+            if start == -1:
+                return new_fields
+            self._pos = start + 1
+
+        while True:
+            pos = self._skip(self._pos, ",")
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == "}":
+                self.done = True
+                break
+
+            # Key, colon, then a value that must be complete (not just a valid prefix)
+            try:
+                key, pos = self._decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break
+            pos = self._skip(pos)
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] != ":":
+                raise ValueError(f"Expected ':' after key {key!r} at {pos}")
+            pos = self._skip(pos + 1)
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if end >= len(self.buffer) or self.buffer[end] not in _VALUE_END:
+                    break
+
+            self.fields[key] = value
+            new_fields[key] = value
+            self._pos = end
+
+        return new_fields
+
+    def _skip(self, pos: int, extra: str = "") -> int:
+        while pos < len(self.buffer) and (self.buffer[pos] in _WHITESPACE or self.buffer[pos] in extra):
+            pos += 1
+        return pos
@@ -0,0 +1,232 @@
+"""
+Cache of LLM parse results for /add.
+People repeat the same phrases ("gym at 6pm", "cs hw due friday"), but relative
+dates make a parse valid only for the day it was made. Entries are keyed on the
+normalized text, the local date, the model and PROMPT_VERSION, and expire at
+local midnight. Recent entries stay in an in-memory LRU in front of SQLite, so
+a hit skips the LLM call and usually the disk too. From the event loop only the
+memory lookup runs inline, SQLite reads and writes go to the default executor.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from lib.prompts import PROMPT_VERSION, USER_TIMEZONE, local_today
+
+DEFAULT_CACHE_PATH = "llm_cache.db"
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def normalize_input(text: str) -> str:
+    """Fold case, unicode forms and whitespace so trivially different phrasings share an entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def make_cache_key(text: str, current_date: str, model: str) -> str:
+    raw = "\x1f".join([normalize_input(text), current_date, model, PROMPT_VERSION])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def next_local_midnight(current_date: str) -> float:
+    """Epoch seconds when current_date ends in the user timezone."""
+    day = datetime.strptime(current_date, "%Y-%m-%d").replace(tzinfo=ZoneInfo(USER_TIMEZONE))
+    return (day + timedelta(days=1)).timestamp()
+
+
+class ParseCache:
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        # key -> (response, expires_at), most recently used last
+        self._memory = OrderedDict()
+
+        # Used from the event loop and executor threads
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_parse_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        # Yesterday's entries can never be hit again
+        self.conn.execute("DELETE FROM llm_parse_cache WHERE expires_at <= ?", (time.time(),))
+        self.conn.commit()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for key, or None if missing or past midnight."""
+        cached = self._get_memory(key)
+        if cached is not None:
+            return cached
+        return self._get_disk(key)
+
+    def _get_memory(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+                self.expired += 1
+            return None
+
+    def _get_disk(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, expires_at FROM llm_parse_cache WHERE cache_key=?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model: str, response: str, expires_at: float):
+        if self._put_memory(key, response, expires_at):
+            self._put_disk(key, model, response, expires_at)
+
+    def _put_memory(self, key: str, response: str, expires_at: float) -> bool:
+        # Only keep responses /add can use, a bad one would be served until midnight
+        try:
+            json.loads(response)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            self._remember(key, response, expires_at)
+        return True
+
+    def _put_disk(self, key: str, model: str, response: str, expires_at: float):
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO llm_parse_cache (cache_key, model, response, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                  response=excluded.response,
+                  expires_at=excluded.expires_at
+            """, (key, model, response, expires_at))
+            self.conn.commit()
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _aget(self, key: str) -> str | None:
+        cached = self._get_memory(key)
+        if cached is not None:
+            return cached
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key)
+
+    def _aput(self, key: str, model: str, response: str, expires_at: float):
+        # Usable from memory right away, the disk write finishes in the background
+        if not self._put_memory(key, response, expires_at):
+            return
+        future = asyncio.get_running_loop().run_in_executor(None, self._put_disk, key, model, response, expires_at)
+        future.add_done_callback(_log_write_error)
+
+    async def get_or_call(self, text: str, model: str, call) -> str:
+        """
+        Return the cached response for text, or await call(current_date) and cache it.
+        The prompt and the key use the same date, so a parse made just before midnight
+        is never stored under the next day.
+        """
+        current_date = local_today()
+        key = make_cache_key(text, current_date, model)
+        cached = await self._aget(key)
+        if cached is not None:
+            return cached
+
+        response = await call(current_date)
+        self._aput(key, model, response, next_local_midnight(current_date))
+        return response
+
+    async def stream_or_call(self, text: str, model: str, stream):
+        """
+        Streaming version of get_or_call: yields the cached response as one chunk, or
+        the chunks of stream(current_date), caching the whole response once it finishes.
+        """
+        current_date = local_today()
+        key = make_cache_key(text, current_date, model)
+        cached = await self._aget(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in stream(current_date):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached when the stream ran to the end, a cut-off response is never stored
+        self._aput(key, model, "".join(chunks), next_local_midnight(current_date))
+
+    def purge_expired(self) -> int:
+        """Drop entries past their midnight. Returns how many rows were removed from disk."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, expires_at) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            cur = self.conn.execute("DELETE FROM llm_parse_cache WHERE expires_at <= ?", (now,))
+            self.conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_parse_cache").fetchone()[0]
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "memory_entries": len(self._memory),
+                "entries": entries,
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def _log_write_error(future):
+    # A failed write only costs a future disk hit, the response is already cached in memory
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Writing the LLM parse cache failed: {future.exception()}")
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_parse_cache() -> ParseCache | None:
+    """The process-wide cache, or None when LLM_CACHE=0."""
+    global _CACHE
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ParseCache(max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))))
+        return _CACHE
@@ -1,65 +1,190 @@
 import asyncio
-import requests
+import json
+import os
+import time
+import httpx
 from typing import Dict, List
 from .prompts import OPENAI_SYSTEM_PROMPT, get_user_prompt
+from .llm_cache import get_parse_cache
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
 MODEL = "llama3.1:8b"  # Change to your preferred model
 
+# How long Ollama keeps the model loaded after a request ("30m", "24h", or -1 for as long as it runs)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+
+# Deadline for a whole /add request, and for the warm-up that may have to load the model from disk
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "60"))
+OLLAMA_WARMUP_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_WARMUP_TIMEOUT_SECONDS", "300"))
+
 class LLMError(Exception):
     """Raise this error for LLM related issues."""
     pass
 
 
-def _generate_response_sync(messages: List[Dict[str, str]]) -> str:
-    """Synchronous helper for making Ollama requests."""
+# One pooled client for the whole process, so requests reuse the open connection
+_client: httpx.AsyncClient | None = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            # The overall deadline is enforced per request, this only bounds connecting
+            timeout=httpx.Timeout(None, connect=5.0),
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=300),
+        )
+    return _client
+
+
+def _keep_alive():
+    # Ollama takes a number of seconds or a duration string
+    try:
+        return int(OLLAMA_KEEP_ALIVE)
+    except ValueError:
+        return OLLAMA_KEEP_ALIVE
+
+
+async def _generate_response(messages: List[Dict[str, str]], timeout: float = OLLAMA_TIMEOUT_SECONDS) -> str:
+    """Send a chat request to Ollama, giving up after timeout seconds."""
     payload = {
         "model": MODEL,
         "messages": messages,
         "stream": False,
+        "keep_alive": _keep_alive(),
     }
 
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=120)
+        response = await asyncio.wait_for(_get_client().post(OLLAMA_URL, json=payload), timeout)
         response.raise_for_status()
         return response.json()["message"]["content"]
 
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise LLMError(
             "LLM backend unavailable. "
             "Make sure Ollama is running with: `ollama serve`"
         )
 
-    except requests.exceptions.Timeout:
+    except (asyncio.TimeoutError, httpx.TimeoutException):
         raise LLMError(
             "LLM request timed out. "
             "The model may be loading or under heavy load."
         )
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, KeyError, ValueError) as e:
         raise LLMError(f"LLM error: {e}")
 
 
+async def _stream_response(messages: List[Dict[str, str]], timeout: float = OLLAMA_TIMEOUT_SECONDS):
+    """Yield the reply text as Ollama generates it, giving up once timeout seconds have passed in total."""
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "stream": True,
+        "keep_alive": _keep_alive(),
+    }
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    client = _get_client()
+    response = None
+
+    try:
+        request = client.build_request("POST", OLLAMA_URL, json=payload)
+        response = await asyncio.wait_for(client.send(request, stream=True), timeout)
+        response.raise_for_status()
+
+        # One JSON object per line, the last one has done=true
+        lines = response.aiter_lines()
+        while True:
+            try:
+                line = await asyncio.wait_for(lines.__anext__(), max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                break
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise LLMError(f"LLM error: {data['error']}")
+            content = data.get("message", {}).get("content")
+            if content:
+                yield content
+            if data.get("done"):
+                break
+
+    except httpx.ConnectError:
+        raise LLMError(
+            "LLM backend unavailable. "
+            "Make sure Ollama is running with: `ollama serve`"
+        )
+
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        raise LLMError(
+            "LLM request timed out. "
+            "The model may be loading or under heavy load."
+        )
+
+    except (httpx.HTTPError, ValueError) as e:
+        raise LLMError(f"LLM error: {e}")
+
+    finally:
+        if response is not None:
+            await response.aclose()
+
+
+async def warm_up_ollama() -> bool:
+    """
+    Load the model into memory ahead of the first /add (a chat request with no
+    messages only loads it). Returns False if Ollama isn't reachable.
+    """
+    started = time.perf_counter()
+    try:
+        await _generate_response([], timeout=OLLAMA_WARMUP_TIMEOUT_SECONDS)
+    except LLMError as e:
+        print(f"Ollama warm-up failed: {e}")
+        return False
+    print(f"Ollama model {MODEL} loaded in {time.perf_counter() - started:.1f}s (keep_alive {OLLAMA_KEEP_ALIVE})")
+    return True
+
+
+async def close_ollama():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def get_ollama_response(user_input: str) -> str:
     """
     Get a response from Ollama using the same prompts as OpenAI.
-    Runs the blocking request in an executor to avoid blocking the event loop.
+    Runs on the event loop over a pooled connection, no executor thread per request.
     """
+    # Repeated phrases on the same day are answered from the cache
+    cache = get_parse_cache()
+    if cache is not None:
+        return await cache.get_or_call(user_input, f"ollama:{MODEL}", lambda current_date: _request_ollama(user_input, current_date))
+    return await _request_ollama(user_input)
+
+
+async def stream_ollama_response(user_input: str):
+    """Same as get_ollama_response, but yields the text as the model generates it."""
+    cache = get_parse_cache()
+    if cache is not None:
+        async for chunk in cache.stream_or_call(user_input, f"ollama:{MODEL}", lambda current_date: _stream_response(_build_messages(user_input, current_date))):
+            yield chunk
+        return
+    async for chunk in _stream_response(_build_messages(user_input)):
+        yield chunk
+
+
+def _build_messages(user_input: str, current_date: str | None = None) -> List[Dict[str, str]]:
     # Prepare the user prompt with current LA date
-    user_prompt = get_user_prompt(user_input)
+    user_prompt = get_user_prompt(user_input, current_date)
 
     # Build messages in OpenAI format (Ollama chat API uses same format)
-    messages = [
+    return [
         {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
         {"role": "user", "content": user_prompt}
     ]
 
-    # Run the blocking request in a thread pool
-    loop = asyncio.get_event_loop()
-    response_text = await loop.run_in_executor(
-        None,
-        _generate_response_sync,
-        messages
-    )
 
-    return response_text
\ No newline at end of file
+async def _request_ollama(user_input: str, current_date: str | None = None) -> str:
+    return await _generate_response(_build_messages(user_input, current_date))
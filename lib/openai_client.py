@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 from openai import AsyncOpenAI
 import os
 from lib.prompts import get_user_prompt, OPENAI_SYSTEM_PROMPT
+from lib.llm_cache import get_parse_cache
 
 
 # Load environment variables from .env file
@@ -10,14 +11,23 @@ load_dotenv()
 # Create the OpenAI client instance
 client = AsyncOpenAI()
 
+OPENAI_MODEL = "gpt-4"
+
 # Create a function to get response from OpenAI asynchronously
 async def get_openai_response(user_input: str):
+    # Repeated phrases on the same day are answered from the cache
+    cache = get_parse_cache()
+    if cache is not None:
+        return await cache.get_or_call(user_input, OPENAI_MODEL, lambda current_date: _request_openai(user_input, current_date))
+    return await _request_openai(user_input)
+
+async def _request_openai(user_input: str, current_date: str | None = None, stream: bool = False):
     # Prepare the user prompt with current LA date
-    user_prompt = get_user_prompt(user_input)
+    user_prompt = get_user_prompt(user_input, current_date)
 
     # Call the OpenAI API asynchronously
     response = await client.chat.completions.create(
-        model="gpt-4",
+        model=OPENAI_MODEL,
         messages=[
             {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
@@ -26,7 +36,27 @@ async def get_openai_response(user_input: str):
         n=1,
         stop=None,
         temperature=0.7,
+        stream=stream,
     )
+    if stream:
+        return response
 
     # Return the content of the response
-    return response.choices[0].message.content
\ No newline at end of file
+    return response.choices[0].message.content
+
+# Same as get_openai_response, but yields the text as the model generates it
+async def stream_openai_response(user_input: str):
+    cache = get_parse_cache()
+    if cache is not None:
+        async for chunk in cache.stream_or_call(user_input, OPENAI_MODEL, lambda current_date: _stream_openai(user_input, current_date)):
+            yield chunk
+        return
+    async for chunk in _stream_openai(user_input):
+        yield chunk
+
+async def _stream_openai(user_input: str, current_date: str | None = None):
+    stream = await _request_openai(user_input, current_date, stream=True)
+    async for chunk in stream:
+        # The final chunk carries only the finish reason
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
\ No newline at end of file
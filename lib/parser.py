@@ -1,8 +1,10 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime, date, time, timedelta
 from typing import Optional, Literal
+from zoneinfo import ZoneInfo
 import re
-import dateparser
+import dateparser.search
 
 # Define the types of items we can parse
 ItemType = Literal["event", "task"]
@@ -15,61 +17,280 @@ class ParsedItem:
     when: Optional[str] = None # ISO String for now - can be improved later
     location: Optional[str] = None
     raw: str = "" # Original raw text
+    end: Optional[str] = None # ISO end time for events
+    due_date: Optional[str] = None # YYYY-MM-DD for tasks
+    assumptions: list[str] = field(default_factory=list)
+    confidence: float = 0.0 # 0-1, how sure we are this matches what the LLM would produce
+
+    def to_payload(self) -> dict:
+        """The same JSON schema the LLM returns (see get_user_prompt), for build_preview_embed and /add."""
+        return {
+            "type": self.kind,
+            "title": self.title,
+            "start_time": self.when if self.kind == "event" else None,
+            "end_time": self.end if self.kind == "event" else None,
+            "due_date": self.due_date if self.kind == "task" else None,
+            "location": self.location,
+            "notes": None,
+            "assumptions": self.assumptions[:4],
+        }
 
 # Keywords to help identify tasks
 TASK_HINTS = [
-    "homework", "assignment", "submit", "turn in", "due", "finish",
-    "complete", "study", "read", "quiz", "exam", "project"
+    "homework", "hw", "assignment", "submit", "turn in", "due", "finish",
+    "complete", "study", "read", "quiz", "exam", "project", "essay", "pset",
+    "problem set", "worksheet", "lab report"
+]
+
+# Default event lengths, same as the LLM system prompt
+DURATION_HINTS = [
+    (("dinner", "lunch", "breakfast", "brunch", "meal", "restaurant"), 120),
+    (("meeting", "appointment", "interview"), 60),
+    (("class", "lecture"), 75),
 ]
+DEFAULT_DURATION_MINUTES = 60
+
+# Phrases the local parser can't interpret reliably (recurrence, ranges, vague times)
+AMBIGUOUS_RE = re.compile(
+    r"\b(every|each|daily|weekly|monthly|until|till|between|from|through|thru|or|maybe|around|ish|sometime|remind)\b"
+    r"|\d\s*-\s*\d",
+    re.IGNORECASE
+)
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+# Each pattern swallows a leading connector ("on friday", "at 6pm", "due tomorrow") so the title comes out clean
+TIME_RE = re.compile(
+    r"(?:\b(?:at|by)\s+|@\s*)?\b(?:(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)(?!\w)|(noon|midnight)\b)",
+    re.IGNORECASE
+)
+TIME_24H_RE = re.compile(r"(?:\b(?:at|by)\s+|@\s*)\b([01]?\d|2[0-3]):(\d{2})\b", re.IGNORECASE)
+DAY_RE = re.compile(r"(?:\b(?:on|by|due)\s+)?\b(today|tonight|tomorrow|tmrw|tmr)\b", re.IGNORECASE)
+WEEKDAY_RE = re.compile(
+    r"(?:\b(?:on|by|due)\s+)?\b(?:(this|next)\s+)?(mon|tue|tues|wed|weds|wednes|thu|thur|thurs|fri|sat|satur|sun)(?:day)?\b",
+    re.IGNORECASE
+)
+MONTH_DAY_RE = re.compile(
+    r"(?:\b(?:on|by|due)\s+)?\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b",
+    re.IGNORECASE
+)
+NUMERIC_DATE_RE = re.compile(r"(?:\b(?:on|by|due)\s+)?\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b", re.IGNORECASE)
+RELATIVE_RE = re.compile(r"\bin\s+(\d+)\s+(minutes?|mins?|hours?|hrs?|days?|weeks?)\b", re.IGNORECASE)
+
+# Location is whatever follows a trailing "at" / "in" / "@" once the time phrases are gone (events only)
+LOCATION_RE = re.compile(r"\s(at|in|@)\s+(.+)$", re.IGNORECASE)
+
+# "in <x>" is as often a subject ("essay in english") as a place, so such a location is only a guess
+# and the confidence is capped below the default LOCAL_PARSE_THRESHOLD to let the LLM decide
+GUESSED_LOCATION_CONFIDENCE = 0.6
+
+# Connectors left dangling at the ends of the title (not a trailing "in", which ends "turn in")
+EDGE_WORDS_RE = re.compile(
+    r"^(?:(?:(?:at|on|by|due|in|for)\b|[@,:-])\s*)+|(?:\s*(?:\b(?:at|on|by|due|for)|[@,:-]))+$",
+    re.IGNORECASE
+)
+
+
+def _has_hint(lower: str, hints) -> bool:
+    return any(re.search(rf"\b{re.escape(h)}\b", lower) for h in hints)
+
+
+def _resolve_year(today: date, month: int, day: int, year: int | None) -> date | None:
+    # Without a year, prefer the next occurrence, like the LLM is told to
+    try:
+        if year is not None:
+            return date(year + 2000 if year < 100 else year, month, day)
+        candidate = date(today.year, month, day)
+        if candidate < today:
+            candidate = date(today.year + 1, month, day)
+        return candidate
+    except ValueError:
+        return None
+
+
+def _find_dates(t: str, now: datetime) -> list[tuple[tuple[int, int], date | None, time | None, str | None]]:
+    """All date phrases found in t, as (span, date, time, assumption)."""
+    today = now.date()
+    found = []
+
+    for m in DAY_RE.finditer(t):
+        word = m.group(1).lower()
+        if word in ("today", "tonight"):
+            found.append((m.span(), today, None, None))
+        else:
+            found.append((m.span(), today + timedelta(days=1), None, None))
+
+    for m in WEEKDAY_RE.finditer(t):
+        target = WEEKDAYS.index(m.group(2).lower()[:3])
+        ahead = (target - today.weekday()) % 7
+        assumption = None
+        if m.group(1) and m.group(1).lower() == "next":
+            # "next friday" is ambiguous, take the coming one and say so
+            ahead = ahead or 7
+            assumption = f"next {m.group(2).lower()} = {today + timedelta(days=ahead):%b %d}"
+        found.append((m.span(), today + timedelta(days=ahead), None, assumption))
+
+    for m in MONTH_DAY_RE.finditer(t):
+        d = _resolve_year(today, MONTHS.index(m.group(1).lower()[:3]) + 1, int(m.group(2)), None)
+        found.append((m.span(), d, None, None))
+
+    for m in NUMERIC_DATE_RE.finditer(t):
+        year = int(m.group(3)) if m.group(3) else None
+        found.append((m.span(), _resolve_year(today, int(m.group(1)), int(m.group(2)), year), None, None))
+
+    for m in RELATIVE_RE.finditer(t):
+        amount, unit = int(m.group(1)), m.group(2).lower()
+        if unit.startswith("m"):
+            at = now + timedelta(minutes=amount)
+            found.append((m.span(), at.date(), at.time().replace(second=0, microsecond=0), None))
+        elif unit.startswith("h"):
+            at = now + timedelta(hours=amount)
+            found.append((m.span(), at.date(), at.time().replace(second=0, microsecond=0), None))
+        else:
+            days = amount * 7 if unit.startswith("w") else amount
+            found.append((m.span(), today + timedelta(days=days), None, None))
+
+    return found
+
+
+def _find_times(t: str) -> list[tuple[tuple[int, int], time | None]]:
+    """All clock times found in t, as (span, time)."""
+    found = []
+    for m in TIME_RE.finditer(t):
+        if m.group(4):
+            found.append((m.span(), time(12, 0) if m.group(4).lower() == "noon" else time(0, 0)))
+            continue
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            found.append((m.span(), None))
+            continue
+        pm = m.group(3).lower().startswith("p")
+        found.append((m.span(), time(hour % 12 + (12 if pm else 0), minute)))
+    for m in TIME_24H_RE.finditer(t):
+        found.append((m.span(), time(int(m.group(1)), int(m.group(2)))))
+    return found
+
+
+def _remove_spans(t: str, spans: list[tuple[int, int]]) -> str:
+    for start, end in sorted(spans, reverse=True):
+        t = t[:start] + " " + t[end:]
+    return " ".join(t.split())
+
+
+def _overlaps(span: tuple[int, int], others: list[tuple[int, int]]) -> bool:
+    return any(span[0] < o[1] and o[0] < span[1] for o in others)
+
 
 # Function to parse text input and extract relevant information
-def parse_text(text: str, timezone: str = "America/Los_Angeles") -> ParsedItem:
+def parse_text(text: str, timezone: str = "America/Los_Angeles", now: datetime | None = None) -> ParsedItem:
     """
     Parse the input text to extract item type, title, time, and location.
-    Uses simple heuristics and dateparser for time extraction.
+    Only explicit date/time phrases are interpreted; anything vaguer lowers the
+    confidence so the caller can hand the text to the LLM instead.
     """
 
     # Get cleaned text
-    t = text.strip()
-
-    # 1) Extract time if present
-    dt = dateparser.parse(
-        t,
-        settings={
-            "TIMEZONE": timezone,
-            "RETURN_AS_TIMEZONE_AWARE": True,
-            "PREFER_DATES_FROM": "future"
-        },
-    )
+    t = " ".join(text.split())
+    lower = t.lower()
+    tz = ZoneInfo(timezone)
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    assumptions = []
+    confidence = 1.0
 
-    # Convert to ISO format if date found
-    when_iso = dt.isoformat() if dt else None
+    # 1) Extract explicit dates and times
+    dates = _find_dates(t, now)
+    times = [(span, tm) for span, tm in _find_times(t) if not _overlaps(span, [d[0] for d in dates if d[2]])]
 
-    # 2) Decide if task or event
-    lower = t.lower()
-    kind: ItemType = "task"
-    if dt: # If we found a date or time, assume its an event
-        kind = "event"
-    if any(h in lower for h in TASK_HINTS):
-        kind="task"
+    # Overlapping matches ("next friday" also contains "friday") keep the longest
+    dates.sort(key=lambda d: d[0][0] - d[0][1])
+    kept = []
+    for d in dates:
+        if not _overlaps(d[0], [k[0] for k in kept]):
+            kept.append(d)
+    dates = kept
+
+    if len(dates) > 1 or len(times) > 1:
+        # Ranges or several dates, e.g. "monday and wednesday" or "2pm 4pm"
+        confidence = min(confidence, 0.3)
+    if any(d[1] is None for d in dates) or any(tm is None for _, tm in times):
+        confidence = min(confidence, 0.2)
+
+    day, day_assumption = (dates[0][1], dates[0][3]) if dates else (None, None)
+    clock = dates[0][2] if dates and dates[0][2] else (times[0][1] if times else None)
+    if day_assumption:
+        assumptions.append(day_assumption)
+        confidence -= 0.2
 
-    # 3) Extract location if present (SIMPLE, for now just checks for 'in <something>')
+    # 2) Anything left that looks like a date we didn't understand goes to the LLM
+    rest = _remove_spans(t, [d[0] for d in dates] + [span for span, _ in times])
+    if AMBIGUOUS_RE.search(rest):
+        confidence = min(confidence, 0.3)
+    elif re.search(r"\d", rest) and dateparser.search.search_dates(
+        rest, languages=["en"], settings={"TIMEZONE": timezone, "RETURN_AS_TIMEZONE_AWARE": True}
+    ):
+        confidence = min(confidence, 0.3)
+
+    # 3) Decide if task or event
+    is_task = _has_hint(lower, TASK_HINTS)
+    kind: ItemType = "task" if is_task or clock is None else "event"
+    when_iso = end_iso = due_date = None
+
+    # 4) Extract location if present (the trailing "at/in <place>" once dates are gone).
+    # Only events have one, on a task "in math" / "in lab" belongs to the title
     location = None
-    # Look for " in <location>" at the end of the string
-    m = re.search(r"\bin\s+(.+)$", t, re.IGNORECASE)
+    m = LOCATION_RE.search(" " + rest) if kind == "event" else None
     if m:
-        # Extract location and remove from title
-        location = m.group(1).strip()
+        location = m.group(2).strip(" ,.")
+        rest = (" " + rest)[:m.start()].strip()
+        confidence -= 0.1
+        if m.group(1).lower() == "in":
+            assumptions.append(f"'{location}' is the location")
+            confidence = min(confidence, GUESSED_LOCATION_CONFIDENCE)
 
-    # 4) Title heuristic - remove time and location phrases
-    title = t
-    if location:
-        title = re.sub(r"\bin\s+.+$", "", title, flags=re.IGNORECASE).strip()
+    # 5) Title heuristic - whatever is left without dangling connectors
+    title = EDGE_WORDS_RE.sub("", rest).strip(" ,.-:")
+    if not title:
+        confidence = 0.0
+    if len(title.split()) > 8:
+        # Long free text usually carries details a regex can't place
+        confidence -= 0.3
+
+    if kind == "event":
+        if day is None:
+            day = now.date()
+            start = datetime.combine(day, clock, tzinfo=tz)
+            if start <= now:
+                # A bare time that already passed today means tomorrow
+                day += timedelta(days=1)
+                assumptions.append("time already passed today, using tomorrow")
+                confidence -= 0.1
+        start = datetime.combine(day, clock, tzinfo=tz)
+        minutes = next((m for words, m in DURATION_HINTS if _has_hint(lower, words)), DEFAULT_DURATION_MINUTES)
+        end = start + timedelta(minutes=minutes)
+        assumptions.append(f"default duration {minutes} min")
+        when_iso, end_iso = start.isoformat(), end.isoformat()
+    else:
+        if clock is not None:
+            # "submit hw at 5pm" could be either, the LLM decides better
+            confidence -= 0.3
+        if not is_task:
+            # Neither a time nor a to-do word, could be an all-day event or anything else
+            confidence -= 0.4
+        if day is None:
+            assumptions.append("no due date given, due today")
+            day = now.date()
+        due_date = day.isoformat()
+        when_iso = datetime.combine(day, clock or time(0, 0), tzinfo=tz).isoformat()
 
     return ParsedItem(
         kind = kind,
         title = title,
         when = when_iso,
         location = location,
-        raw = t
-    )
\ No newline at end of file
+        raw = t,
+        end = end_iso,
+        due_date = due_date,
+        assumptions = assumptions,
+        confidence = round(max(0.0, min(1.0, confidence)), 2)
+    )
@@ -1,3 +1,9 @@
+# Timezone used to resolve relative dates ("tomorrow", "friday")
+USER_TIMEZONE = "America/Los_Angeles"
+
+# Bump whenever the prompts change, so cached parses from the old prompts are not reused
+PROMPT_VERSION = "1"
+
 OPENAI_SYSTEM_PROMPT = """You are a scheduling assistant that converts natural language into structured calendar event or task data.
 
 STRICT OUTPUT RULES:
@@ -28,19 +34,23 @@ CLASSIFICATION RULES:
 
 You are not allowed to ask questions."""
 
-def get_user_prompt(user_input: str) -> str:
-    """Generate user prompt with current LA date."""
+def local_today() -> str:
+    """Current date in the user timezone, as YYYY-MM-DD."""
     from datetime import datetime
     from zoneinfo import ZoneInfo
-    
-    pacific = ZoneInfo("America/Los_Angeles")
-    current_date = datetime.now(pacific).strftime("%Y-%m-%d")
+
+    return datetime.now(ZoneInfo(USER_TIMEZONE)).strftime("%Y-%m-%d")
+
+def get_user_prompt(user_input: str, current_date: str | None = None) -> str:
+    """Generate user prompt with current LA date."""
+    if current_date is None:
+        current_date = local_today()
     
     return f"""Parse the following text into structured data.
 
 Text: "{user_input}"
 
-User timezone: America/Los_Angeles
+User timezone: {USER_TIMEZONE}
 Current date (local): {current_date}
 
 Return JSON using EXACTLY this schema (include every key, no extras):
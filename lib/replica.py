@@ -0,0 +1,258 @@
+"""
+Local SQLite replica of the user's Google Tasks and Calendar events.
+Kept fresh in the background with updatedMin deltas (Tasks) and syncToken
+incremental sync (Calendar) so /list, /done and /delete can answer from disk
+instead of waiting on a Google round-trip.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from lib.google_calendar import iter_tasks, normalize_task, today_bounds, LOCAL_TZ, SNAPSHOT_SKEW_SECONDS, EVENT_LIST_FIELDS
+from lib.google_services import get_calendar_service, get_tasks_service
+
+DEFAULT_REPLICA_PATH = "replica.db"
+
+# How far back the first Calendar sync reaches
+EVENT_HISTORY_DAYS = 7
+
+UTC = ZoneInfo("UTC")
+
+
+def _utc_key(dt: datetime) -> str:
+    """Fixed-width UTC timestamp so range queries can compare strings."""
+    return dt.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _event_bound(value: dict) -> str | None:
+    # Timed events carry dateTime, all-day events only a date (local midnight)
+    if value.get("dateTime"):
+        return _utc_key(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+    if value.get("date"):
+        day = datetime.fromisoformat(value["date"])
+        return _utc_key(day.replace(tzinfo=LOCAL_TZ))
+    return None
+
+
+class LocalReplica:
+    def __init__(self, db_path: str = DEFAULT_REPLICA_PATH, calendar_id: str = "primary", tasklist_id: str = "@default"):
+        self.calendar_id = calendar_id
+        self.tasklist_id = tasklist_id
+
+        # Written by the background refresher, read by commands on the event loop
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS replica_tasks (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                due TEXT,
+                notes TEXT,
+                updated TEXT,
+                status TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS replica_events (
+                id TEXT PRIMARY KEY,
+                start_utc TEXT,
+                end_utc TEXT,
+                body TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_replica_tasks_due ON replica_tasks(due)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_replica_events_start ON replica_events(start_utc)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS replica_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def _get_state(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM replica_state WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str | None):
+        self.conn.execute("""
+            INSERT INTO replica_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value
+        """, (key, value))
+
+    def refresh(self, creds):
+        """Pull Tasks and Calendar changes since the last refresh. Blocking, run it off the event loop."""
+        self.refresh_tasks(creds)
+        self.refresh_events(creds)
+        with self._lock:
+            self._set_state("refreshed_at", str(time.time()))
+            self.conn.commit()
+
+    def refresh_tasks(self, creds):
+        service = get_tasks_service(creds)
+
+        with self._lock:
+            updated_min = self._get_state("tasks_synced_at")
+
+        # Stamp the fetch start, backed off a little to cover clock skew with Google
+        synced_at = (datetime.now(UTC) - timedelta(seconds=SNAPSHOT_SKEW_SECONDS)).isoformat().replace("+00:00", "Z")
+
+        # Completed tasks are kept too, /list shows the ones due today
+        params = {"showCompleted": True, "showHidden": True}
+        if updated_min:
+            params.update(updatedMin=updated_min, showDeleted=True)
+        items = list(iter_tasks(service, self.tasklist_id, **params))
+
+        with self._lock:
+            if not updated_min:
+                self.conn.execute("DELETE FROM replica_tasks")
+            for item in items:
+                if item.get("deleted"):
+                    self.conn.execute("DELETE FROM replica_tasks WHERE id=?", (item.get("id"),))
+                    continue
+                self._upsert_task(item)
+            self._set_state("tasks_synced_at", synced_at)
+            self.conn.commit()
+
+    def refresh_events(self, creds):
+        service = get_calendar_service(creds)
+
+        with self._lock:
+            sync_token = self._get_state("calendar_sync_token")
+
+        try:
+            events, next_token = self._list_events(service, sync_token)
+        except HttpError as e:
+            # 410 Gone: the sync token expired, start over with a full sync
+            if e.resp.status != 410:
+                raise
+            sync_token = None
+            events, next_token = self._list_events(service, None)
+
+        with self._lock:
+            if not sync_token:
+                self.conn.execute("DELETE FROM replica_events")
+            for event in events:
+                if event.get("status") == "cancelled":
+                    self.conn.execute("DELETE FROM replica_events WHERE id=?", (event.get("id"),))
+                    continue
+                self._upsert_event(event)
+            # Without a token (Google may not issue one) the next refresh does a full sync again
+            self._set_state("calendar_sync_token", next_token)
+            self.conn.commit()
+
+    def _upsert_task(self, item: dict):
+        task = normalize_task(item)
+        self.conn.execute("""
+            INSERT INTO replica_tasks (id, title, due, notes, updated, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+              title=excluded.title,
+              due=excluded.due,
+              notes=excluded.notes,
+              updated=excluded.updated,
+              status=excluded.status
+        """, (task["id"], task["title"], task["due"], task["notes"], task["updated"], item.get("status")))
+
+    def _upsert_event(self, event: dict):
+        self.conn.execute("""
+            INSERT INTO replica_events (id, start_utc, end_utc, body)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+              start_utc=excluded.start_utc,
+              end_utc=excluded.end_utc,
+              body=excluded.body
+        """, (event["id"], _event_bound(event.get("start", {})), _event_bound(event.get("end", {})), json.dumps(event)))
+
+    def _list_events(self, service, sync_token: str | None) -> tuple[list[dict], str | None]:
+        params = {"calendarId": self.calendar_id, "singleEvents": True, "fields": EVENT_LIST_FIELDS}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = (datetime.now(UTC) - timedelta(days=EVENT_HISTORY_DAYS)).isoformat().replace("+00:00", "Z")
+
+        events = []
+        page_token = None
+        while True:
+            response = service.events().list(pageToken=page_token, **params).execute()
+            events.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return events, response.get("nextSyncToken")
+
+    def age(self) -> float | None:
+        """Seconds since the last successful refresh, or None if never refreshed."""
+        with self._lock:
+            refreshed_at = self._get_state("refreshed_at")
+        if refreshed_at is None:
+            return None
+        return time.time() - float(refreshed_at)
+
+    def is_fresh(self, max_age: float) -> bool:
+        age = self.age()
+        return age is not None and age <= max_age
+
+    def open_tasks(self) -> list[dict]:
+        """Open tasks in the same shape as list_open_tasks."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, title, due, notes, updated FROM replica_tasks WHERE status='needsAction'"
+            ).fetchall()
+        return [{"id": r[0], "title": r[1], "due": r[2], "notes": r[3], "updated": r[4]} for r in rows]
+
+    def today_items(self) -> dict:
+        """Today's events and tasks in the same shape as list_today_items."""
+        date, start_of_day, end_of_day = today_bounds()
+        start_key = _utc_key(datetime.fromisoformat(start_of_day.replace("Z", "+00:00")))
+        end_key = _utc_key(datetime.fromisoformat(end_of_day.replace("Z", "+00:00")))
+
+        with self._lock:
+            event_rows = self.conn.execute(
+                "SELECT body FROM replica_events WHERE start_utc <= ? AND end_utc > ? ORDER BY start_utc",
+                (end_key, start_key)
+            ).fetchall()
+            # Task due dates are date-only (midnight UTC), so match on the date part
+            task_rows = self.conn.execute(
+                "SELECT id, title, due, notes, updated, status FROM replica_tasks WHERE substr(due, 1, 10) = ?",
+                (date.isoformat(),)
+            ).fetchall()
+
+        tasks, completed = [], []
+        for r in task_rows:
+            task = {"id": r[0], "title": r[1], "due": r[2], "notes": r[3], "updated": r[4], "status": r[5]}
+            (completed if r[5] == "completed" else tasks).append(task)
+
+        return {
+            "events": [json.loads(r[0]) for r in event_rows],
+            "tasks": tasks,
+            "completed": completed
+        }
+
+    def add_task(self, item: dict):
+        """Reflect a task created through the API right away."""
+        with self._lock:
+            self._upsert_task(item)
+            self.conn.commit()
+
+    def add_event(self, event: dict):
+        """Reflect an event created through the API right away."""
+        with self._lock:
+            self._upsert_event(event)
+            self.conn.commit()
+
+    def mark_task_done(self, task_id: str):
+        """Reflect a completion made through the API right away."""
+        with self._lock:
+            self.conn.execute("UPDATE replica_tasks SET status='completed' WHERE id=?", (task_id,))
+            self.conn.commit()
+
+    def remove_task(self, task_id: str):
+        """Reflect a deletion made through the API right away."""
+        with self._lock:
+            self.conn.execute("DELETE FROM replica_tasks WHERE id=?", (task_id,))
+            self.conn.commit()
@@ -1,7 +1,14 @@
 import sqlite3
 
-def init_db(db_path: str = "sync.db"):
-    conn = sqlite3.connect(db_path)
+# Stay under SQLite's bound-parameter limit for IN (...) lists
+MAX_IN_PARAMS = 500
+
+"""
+Schema migrations. MIGRATIONS[i] upgrades a database from user_version i to i + 1.
+Databases created before versioning are at 0 but already have the version 1
+tables, which is why the first step uses IF NOT EXISTS.
+"""
+def _create_tables(conn):
     conn.execute("""
         CREATE TABLE IF NOT EXISTS canvas_task_map (
             canvas_assignment_id INTEGER PRIMARY KEY,
@@ -12,7 +19,49 @@ def init_db(db_path: str = "sync.db"):
             last_synced_at TEXT
         )
     """)
-    conn.commit()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS canvas_course_watermark (
+            course_id INTEGER PRIMARY KEY,
+            max_updated_at TEXT,
+            last_synced_at TEXT
+        )
+    """)
+
+def _add_course_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_canvas_task_map_course ON canvas_task_map(course_id)")
+
+def _add_content_hash(conn):
+    # Hash of what was last pushed to Google (title, due, notes); NULL until the next sync fills it in
+    conn.execute("ALTER TABLE canvas_task_map ADD COLUMN content_hash TEXT")
+
+MIGRATIONS = [
+    _create_tables,
+    _add_course_index,
+    _add_content_hash,
+]
+
+def migrate(conn):
+    """Bring the schema up to date, one transaction per step."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def init_db(db_path: str = "sync.db"):
+    # Transactions are managed explicitly so migrations can include DDL
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # WAL + NORMAL only fsyncs at checkpoints instead of on every commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    # Back to the default behaviour: DML opens a transaction, commit() ends it
+    conn.isolation_level = ""
     return conn
 
 def get_mapping(conn, canvas_assignment_id: int):
@@ -22,18 +71,83 @@ def get_mapping(conn, canvas_assignment_id: int):
     )
     return cur.fetchone()
 
-def upsert_mapping(conn, canvas_assignment_id: int, course_id: int, google_task_id: str, canvas_updated_at: str, canvas_due_at: str = None, last_synced_at: str = None):
+def load_mappings(conn, course_ids) -> dict:
+    """Return {canvas_assignment_id: (google_task_id, canvas_updated_at, canvas_due_at, content_hash)} for the given courses."""
+    course_ids = list(course_ids)
+    mappings = {}
+    for i in range(0, len(course_ids), MAX_IN_PARAMS):
+        chunk = course_ids[i:i + MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT canvas_assignment_id, google_task_id, canvas_updated_at, canvas_due_at, content_hash FROM canvas_task_map WHERE course_id IN ({placeholders})",
+            chunk
+        )
+        for row in cur:
+            mappings[row[0]] = (row[1], row[2], row[3], row[4])
+    return mappings
+
+def upsert_mapping(conn, canvas_assignment_id: int, course_id: int, google_task_id: str, canvas_updated_at: str, canvas_due_at: str = None, last_synced_at: str = None, content_hash: str = None):
     from datetime import datetime
     if last_synced_at is None:
         last_synced_at = datetime.utcnow().isoformat()
     
     conn.execute("""
-        INSERT INTO canvas_task_map (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO canvas_task_map (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(canvas_assignment_id) DO UPDATE SET
           google_task_id=excluded.google_task_id,
           canvas_updated_at=excluded.canvas_updated_at,
           canvas_due_at=excluded.canvas_due_at,
+          last_synced_at=excluded.last_synced_at,
+          content_hash=excluded.content_hash
+    """, (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at, content_hash))
+    conn.commit()
+
+def upsert_mappings(conn, rows, commit: bool = True):
+    """
+    Upsert many mappings in one statement.
+    rows are (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at, content_hash).
+    """
+    conn.executemany("""
+        INSERT INTO canvas_task_map (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(canvas_assignment_id) DO UPDATE SET
+          google_task_id=excluded.google_task_id,
+          canvas_updated_at=excluded.canvas_updated_at,
+          canvas_due_at=excluded.canvas_due_at,
+          last_synced_at=excluded.last_synced_at,
+          content_hash=excluded.content_hash
+    """, rows)
+    if commit:
+        conn.commit()
+
+def get_watermarks(conn) -> dict:
+    """Return {course_id: (max_updated_at, last_synced_at)} for every synced course."""
+    cur = conn.execute("SELECT course_id, max_updated_at, last_synced_at FROM canvas_course_watermark")
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+def upsert_watermark(conn, course_id: int, max_updated_at: str, last_synced_at: str = None):
+    from datetime import datetime
+    if last_synced_at is None:
+        last_synced_at = datetime.utcnow().isoformat()
+
+    conn.execute("""
+        INSERT INTO canvas_course_watermark (course_id, max_updated_at, last_synced_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(course_id) DO UPDATE SET
+          max_updated_at=excluded.max_updated_at,
+          last_synced_at=excluded.last_synced_at
+    """, (course_id, max_updated_at, last_synced_at))
+    conn.commit()
+
+def upsert_watermarks(conn, rows, commit: bool = True):
+    """Upsert many watermarks in one statement. rows are (course_id, max_updated_at, last_synced_at)."""
+    conn.executemany("""
+        INSERT INTO canvas_course_watermark (course_id, max_updated_at, last_synced_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(course_id) DO UPDATE SET
+          max_updated_at=excluded.max_updated_at,
           last_synced_at=excluded.last_synced_at
-    """, (canvas_assignment_id, course_id, google_task_id, canvas_updated_at, canvas_due_at, last_synced_at))
-    conn.commit()
\ No newline at end of file
+    """, rows)
+    if commit:
+        conn.commit()
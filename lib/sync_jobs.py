@@ -0,0 +1,257 @@
+"""
+Durable Canvas sync job queue in SQLite.
+The bot enqueues one job per user, worker processes claim them with a lease
+and renew it while they work. A job whose worker died is picked up again once
+its lease runs out, and failures are retried with exponential backoff.
+Users are split into shards (user_id % shards) so each worker process mostly
+serves the same users; a worker with nothing of its own to do takes jobs from
+other shards. A user never has two jobs running at once.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+
+DEFAULT_QUEUE_PATH = "sync_jobs.db"
+
+# The shared token.json / CANVAS_TOKEN account, as opposed to a linked Discord user
+SHARED_ACCOUNT_ID = 0
+
+# How long a claimed job stays owned without a heartbeat
+DEFAULT_LEASE_SECONDS = 120
+
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 30 * 60
+
+
+class PermanentJobError(Exception):
+    """A failure retrying won't fix (e.g. missing credentials), the job fails right away."""
+
+
+def shard_for(user_id: int, shards: int) -> int:
+    return user_id % max(1, shards)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter."""
+    cap = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return random.uniform(0, cap)
+
+
+class SyncJobQueue:
+    def __init__(self, db_path: str = DEFAULT_QUEUE_PATH, shards: int = 1):
+        self.shards = max(1, shards)
+        # Shared by the bot's executor threads and a worker's heartbeat thread
+        self._lock = threading.RLock()
+        # Transactions are managed explicitly, claims need BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, isolation_level=None, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                shard INTEGER NOT NULL,
+                full INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_jobs_claim ON sync_jobs(status, run_after)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_jobs_user ON sync_jobs(user_id, status)")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def enqueue(self, user_id: int, full: bool = False, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """Queue a sync for user_id and return its job ID. A user's queued job is reused, not duplicated."""
+        with self._lock:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM sync_jobs WHERE user_id=? AND status='queued' ORDER BY id LIMIT 1",
+                    (user_id,)
+                ).fetchone()
+                if row:
+                    job_id = row[0]
+                    # Asking for a full resync upgrades the waiting job, and it shouldn't wait on an old backoff
+                    self.conn.execute(
+                        "UPDATE sync_jobs SET full=MAX(full, ?), run_after=MIN(run_after, ?), updated_at=? WHERE id=?",
+                        (int(full), now, now, job_id)
+                    )
+                else:
+                    cur = self.conn.execute("""
+                        INSERT INTO sync_jobs (user_id, shard, full, status, max_attempts, run_after, created_at, updated_at)
+                        VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)
+                    """, (user_id, shard_for(user_id, self.shards), int(full), max_attempts, now, now, now))
+                    job_id = cur.lastrowid
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return job_id
+
+    def claim(self, worker_id: str, shards: list[int] | None = None, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> dict | None:
+        """
+        Lease the next runnable job, preferring the given shards, or return None.
+        Jobs whose lease expired are retried like a failed attempt, so a job that
+        keeps killing its worker still stops after max_attempts.
+        """
+        with self._lock:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Hand back jobs whose worker stopped renewing the lease
+                expired = self.conn.execute(
+                    "SELECT id FROM sync_jobs WHERE status='running' AND lease_expires < ?", (now,)
+                ).fetchall()
+                for (job_id,) in expired:
+                    self._retry_or_fail(job_id, "The worker stopped before the job finished.", now)
+
+                runnable = """
+                    SELECT id FROM sync_jobs j
+                    WHERE status='queued' AND run_after <= ?
+                      AND NOT EXISTS (SELECT 1 FROM sync_jobs r WHERE r.user_id=j.user_id AND r.status='running')
+                      {shard_filter}
+                    ORDER BY run_after, id LIMIT 1
+                """
+                row = None
+                if shards:
+                    placeholders = ",".join("?" * len(shards))
+                    row = self.conn.execute(
+                        runnable.format(shard_filter=f"AND shard IN ({placeholders})"), (now, *shards)
+                    ).fetchone()
+                if row is None:
+                    # Nothing in our own shards, help out with the rest
+                    row = self.conn.execute(runnable.format(shard_filter=""), (now,)).fetchone()
+
+                job = None
+                if row:
+                    self.conn.execute("""
+                        UPDATE sync_jobs SET status='running', attempts=attempts + 1, lease_owner=?, lease_expires=?, updated_at=?
+                        WHERE id=?
+                    """, (worker_id, now + lease_seconds, now, row[0]))
+                    job = self._get(row[0])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return job
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS, progress: dict | None = None) -> bool:
+        """Renew the lease (and store progress). Returns False if the job is no longer ours."""
+        with self._lock:
+            now = time.time()
+            if progress is None:
+                cur = self.conn.execute("""
+                    UPDATE sync_jobs SET lease_expires=?, updated_at=?
+                    WHERE id=? AND lease_owner=? AND status='running'
+                """, (now + lease_seconds, now, job_id, worker_id))
+            else:
+                cur = self.conn.execute("""
+                    UPDATE sync_jobs SET lease_expires=?, progress=?, updated_at=?
+                    WHERE id=? AND lease_owner=? AND status='running'
+                """, (now + lease_seconds, json.dumps(progress), now, job_id, worker_id))
+            return cur.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: dict):
+        with self._lock:
+            now = time.time()
+            self.conn.execute("""
+                UPDATE sync_jobs SET status='done', result=?, error=NULL, lease_owner=NULL, lease_expires=NULL, updated_at=?
+                WHERE id=? AND lease_owner=?
+            """, (json.dumps(result), now, job_id, worker_id))
+
+    def fail(self, job_id: int, worker_id: str, error: str, permanent: bool = False):
+        """Record a failed attempt: retry later with backoff, or give up after max_attempts."""
+        with self._lock:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                owned = self.conn.execute(
+                    "SELECT 1 FROM sync_jobs WHERE id=? AND lease_owner=?", (job_id, worker_id)
+                ).fetchone()
+                if owned:
+                    self._retry_or_fail(job_id, error, now, permanent)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _retry_or_fail(self, job_id: int, error: str, now: float, permanent: bool = False):
+        # Runs inside the caller's transaction
+        user_id, full, attempts, max_attempts = self.conn.execute(
+            "SELECT user_id, full, attempts, max_attempts FROM sync_jobs WHERE id=?", (job_id,)
+        ).fetchone()
+        if permanent or attempts >= max_attempts:
+            self.conn.execute("""
+                UPDATE sync_jobs SET status='failed', error=?, lease_owner=NULL, lease_expires=NULL, updated_at=?
+                WHERE id=?
+            """, (error, now, job_id))
+            return
+
+        # A sync queued for the user meanwhile does the retry, the same as enqueue() reusing it
+        queued = self.conn.execute(
+            "SELECT id FROM sync_jobs WHERE user_id=? AND status='queued' ORDER BY id LIMIT 1", (user_id,)
+        ).fetchone()
+        if queued:
+            self.conn.execute(
+                "UPDATE sync_jobs SET full=MAX(full, ?), updated_at=? WHERE id=?", (full, now, queued[0])
+            )
+            self.conn.execute("""
+                UPDATE sync_jobs SET status='failed', error=?, lease_owner=NULL, lease_expires=NULL, updated_at=?
+                WHERE id=?
+            """, (f"{error} Retrying as job {queued[0]}.", now, job_id))
+            return
+
+        self.conn.execute("""
+            UPDATE sync_jobs SET status='queued', error=?, run_after=?, lease_owner=NULL, lease_expires=NULL, updated_at=?
+            WHERE id=?
+        """, (error, now + retry_delay(attempts), now, job_id))
+
+    def get(self, job_id: int) -> dict | None:
+        with self._lock:
+            return self._get(job_id)
+
+    def _get(self, job_id: int) -> dict | None:
+        row = self.conn.execute("""
+            SELECT id, user_id, shard, full, status, attempts, max_attempts, run_after, progress, result, error
+            FROM sync_jobs WHERE id=?
+        """, (job_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0], "user_id": row[1], "shard": row[2], "full": bool(row[3]), "status": row[4],
+            "attempts": row[5], "max_attempts": row[6], "run_after": row[7],
+            "progress": json.loads(row[8]) if row[8] else None,
+            "result": json.loads(row[9]) if row[9] else None,
+            "error": row[10],
+        }
+
+    def stats(self) -> dict:
+        """Number of jobs in each status."""
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM sync_jobs GROUP BY status").fetchall()
+            return dict(rows)
+
+    def purge(self, older_than_seconds: float = 7 * 24 * 3600):
+        """Drop finished jobs older than the cutoff."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM sync_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than_seconds,)
+            )
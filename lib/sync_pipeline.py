@@ -0,0 +1,185 @@
+"""
+Building blocks for a staged, threaded pipeline.
+Stages are connected by bounded queues so a fast stage can't run far ahead of
+a slow one, and each stage runs its own number of worker threads. Every stage
+keeps simple stats (items handled, busy time, queue depth) so it is easy to
+see which one is the bottleneck.
+"""
+
+import queue
+import threading
+import time
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StageWorker:
+    """One worker thread's handler. Subclass and override handle(); idle() and finish() are optional."""
+
+    def handle(self, item, emit):
+        raise NotImplementedError
+
+    def idle(self, emit):
+        """Called when no input arrived for the stage's idle_timeout."""
+
+    def finish(self, emit):
+        """Called once after the input is exhausted."""
+
+
+class FunctionWorker(StageWorker):
+    def __init__(self, fn):
+        self.fn = fn
+
+    def handle(self, item, emit):
+        self.fn(item, emit)
+
+
+class Stage:
+    def __init__(self, name: str, make_worker, workers: int = 1, queue_size: int = 64, idle_timeout: float | None = None):
+        self.name = name
+        self.make_worker = make_worker  # called inside each worker thread
+        self.workers = max(1, workers)
+        self.idle_timeout = idle_timeout
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.outbox = None  # the next stage's inbox, set by Pipeline
+
+        self.error = None  # first unexpected exception, re-raised by Pipeline.run
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+    def emit(self, item):
+        if self.outbox is not None:
+            self.outbox.put(item)
+
+    def _timed(self, fn, *args, counts: bool = False):
+        started = time.perf_counter()
+        try:
+            fn(*args)
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+                if counts:
+                    self.items += 1
+                    self.max_queue_depth = max(self.max_queue_depth, self.inbox.qsize())
+
+    def _work(self):
+        try:
+            worker = self.make_worker()
+            while True:
+                try:
+                    item = self.inbox.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    self._timed(worker.idle, self.emit)
+                    continue
+
+                if item is _DONE:
+                    # Leave it for the other workers of this stage
+                    self.inbox.put(_DONE)
+                    break
+
+                self._timed(worker.handle, item, self.emit, counts=True)
+
+            self._timed(worker.finish, self.emit)
+        except Exception as e:
+            print(f"Pipeline stage {self.name} failed: {e}")
+            with self._lock:
+                if self.error is None:
+                    self.error = e
+            # Keep draining so upstream stages never block on a full queue
+            while self.inbox.get() is not _DONE:
+                pass
+            self.inbox.put(_DONE)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                self.finished_at = time.perf_counter()
+                self.emit(_DONE)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._running = self.workers
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = (self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "busy_s": round(self.busy_seconds, 3),
+                "items_per_sec": round(self.items / elapsed, 1) if elapsed > 0 else 0.0,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+class Pipeline:
+    """Runs stages in order: items fed in go to the first stage, each stage's output to the next."""
+
+    def __init__(self, stages: list[Stage], source_name: str = "source"):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.outbox = downstream.inbox
+
+        # The source is iterated on the calling thread, it gets the same stats as a stage
+        self.source_name = source_name
+        self.source_items = 0
+        self.source_busy_seconds = 0.0
+        self.elapsed = 0.0
+
+    def run(self, source):
+        """Feed every item from source through the pipeline and wait for all stages to finish."""
+        for stage in self.stages:
+            stage.start()
+
+        first = self.stages[0]
+        started = time.perf_counter()
+        try:
+            source = iter(source)
+            while True:
+                # Only time spent producing counts as busy, not time blocked on a full queue
+                produce_started = time.perf_counter()
+                try:
+                    item = next(source)
+                except StopIteration:
+                    break
+                finally:
+                    self.source_busy_seconds += time.perf_counter() - produce_started
+                self.source_items += 1
+                first.inbox.put(item)
+        finally:
+            first.inbox.put(_DONE)
+            for stage in self.stages:
+                stage.join()
+            self.elapsed = time.perf_counter() - started
+
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+    def stats(self) -> dict:
+        source = {
+            "items": self.source_items,
+            "busy_s": round(self.source_busy_seconds, 3),
+            "items_per_sec": round(self.source_items / self.elapsed, 1) if self.elapsed > 0 else 0.0,
+        }
+        stats = {self.source_name: source}
+        stats.update((stage.name, stage.stats()) for stage in self.stages)
+        stats["total_s"] = round(self.elapsed, 3)
+        return stats
@@ -0,0 +1,97 @@
+"""
+Single-flight coordination and scheduling for the Canvas sync.
+Only one sync runs at a time: anyone who asks while one is running waits for
+it and gets the same result instead of starting a second one against sync.db.
+Progress events from the sync threads are handed to the event loop and fanned
+out to everyone waiting on the run.
+"""
+
+import asyncio
+import random
+import time
+
+
+class SyncCoordinator:
+    def __init__(self, sync_fn):
+        # Blocking sync_fn(full: bool, on_progress) -> summary dict, run in the default executor
+        self.sync_fn = sync_fn
+        self._current = None  # (task, full) of the run in flight
+        self._subscribers = []  # on_progress callbacks of everyone waiting
+        self.last_progress = None
+        self.last_result = None
+        self.last_finished_at = None
+        self.runs = 0
+        self.coalesced = 0
+
+    def is_running(self) -> bool:
+        return self._current is not None
+
+    async def run(self, full: bool = False, on_progress=None) -> dict:
+        """
+        Run a sync, or join the one already running. Cancelling the caller never cancels the sync.
+        on_progress(event) is called on the event loop with each progress event until the run finishes.
+        """
+        if on_progress is None:
+            return await self._join_or_start(full)
+
+        self._subscribers.append(on_progress)
+        try:
+            # Someone joining late starts from where the run is now
+            if self._current is not None and self.last_progress is not None:
+                on_progress(self.last_progress)
+            return await self._join_or_start(full)
+        finally:
+            self._subscribers.remove(on_progress)
+
+    async def _join_or_start(self, full: bool) -> dict:
+        while self._current is not None:
+            task, running_full = self._current
+            if running_full or not full:
+                # The run in flight covers this request, share its result
+                self.coalesced += 1
+                return await asyncio.shield(task)
+
+            # A full resync was asked for during a partial one: wait for it, then start ours
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                pass
+
+        task = asyncio.get_running_loop().create_task(self._run(full))
+        self._current = (task, full)
+        return await asyncio.shield(task)
+
+    def _publish(self, event: dict):
+        self.last_progress = event
+        for on_progress in list(self._subscribers):
+            try:
+                on_progress(event)
+            except Exception as e:
+                print(f"Sync progress subscriber failed: {e}")
+
+    async def _run(self, full: bool) -> dict:
+        loop = asyncio.get_running_loop()
+        self.last_progress = None
+
+        def report(event: dict):
+            # Called on the sync's threads, hop over to the event loop
+            loop.call_soon_threadsafe(self._publish, event)
+
+        try:
+            result = await loop.run_in_executor(None, self.sync_fn, full, report)
+            self.last_result = result
+            self.last_finished_at = time.time()
+            return result
+        finally:
+            self.runs += 1
+            self._current = None
+
+    async def run_forever(self, interval: float, jitter: float = 0.1):
+        """Sync every interval seconds, give or take jitter (a fraction), so runs don't line up with other load."""
+        while True:
+            await asyncio.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+            try:
+                summary = await self.run()
+                print(f"Scheduled Canvas sync: {summary}")
+            except Exception as e:
+                print(f"Scheduled Canvas sync failed: {e}")
@@ -0,0 +1,192 @@
+"""
+Canvas sync worker processes.
+Each worker claims jobs from the SyncJobQueue, runs the sync for that user
+with their own Google (and Canvas) credentials and sync database, and keeps
+the job's lease and progress fresh while it runs. Workers are separate
+processes, so any number of queued syncs never slow down the bot itself.
+
+Run standalone with: python -m lib.sync_worker --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+from lib.canvas_cache import CanvasResponseCache
+from lib.canvas_client import CanvasClient
+from lib.canvas_sync import sync_canvas_assignments_to_google_tasks
+from lib.google_auth import get_creds
+from lib.credential_store import get_user_store
+from lib.sync_jobs import SyncJobQueue, PermanentJobError, SHARED_ACCOUNT_ID, DEFAULT_QUEUE_PATH, DEFAULT_LEASE_SECONDS
+
+# How long an idle worker waits before checking the queue again
+POLL_SECONDS = 2.0
+
+# How often a running job renews its lease and publishes progress
+HEARTBEAT_SECONDS = 10.0
+
+# How often the first worker drops old finished jobs from the queue
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def parent_alive(parent_pid: int | None) -> bool:
+    # An orphaned process is re-parented, so a changed parent pid means ours exited
+    return parent_pid is None or os.getppid() == parent_pid
+
+
+def sync_db_path(user_id: int) -> str:
+    """Each user gets their own mapping database; the shared account keeps sync.db."""
+    if user_id == SHARED_ACCOUNT_ID:
+        return "sync.db"
+    return f"sync_{user_id}.db"
+
+
+def resolve_accounts(user_id: int):
+    """Google credentials and (base_url, token) for Canvas, for the shared account or a linked user."""
+    if user_id == SHARED_ACCOUNT_ID:
+        base_url, token = os.getenv("CANVAS_BASE_URL"), os.getenv("CANVAS_TOKEN")
+        if not base_url or not token:
+            raise PermanentJobError("Canvas API credentials not configured. Set CANVAS_TOKEN and CANVAS_BASE_URL in .env")
+        return get_creds(), (base_url, token)
+
+    store = get_user_store()
+    if store:
+        # The user may have linked, re-linked or unlinked through the bot since this worker started
+        store.reload_user(user_id)
+    if not store or not store.has_user(user_id):
+        raise PermanentJobError("No linked Google account, run /link_google first.")
+    canvas = store.get_canvas_token(user_id)
+    if not canvas:
+        raise PermanentJobError("No linked Canvas account, run /link_canvas first.")
+    return store.get(user_id), canvas
+
+
+def run_job(queue: SyncJobQueue, job: dict, worker_id: str, cache: CanvasResponseCache) -> dict:
+    """Run one claimed job, renewing its lease in the background until it finishes."""
+    latest = {"progress": None}
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                if not queue.heartbeat(job["id"], worker_id, DEFAULT_LEASE_SECONDS, latest["progress"]):
+                    print(f"[{worker_id}] Lost the lease on job {job['id']}")
+            except Exception as e:
+                print(f"[{worker_id}] Heartbeat failed for job {job['id']}: {e}")
+
+    thread = threading.Thread(target=heartbeat, name=f"{worker_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        creds, (base_url, token) = resolve_accounts(job["user_id"])
+        canvas_client = CanvasClient(base_url, token, cache=cache)
+        return sync_canvas_assignments_to_google_tasks(
+            canvas_client,
+            creds,
+            db_path=sync_db_path(job["user_id"]),
+            max_concurrency=int(os.getenv("CANVAS_SYNC_CONCURRENCY", "8")),
+            full_resync=job["full"],
+            fetch_mode=os.getenv("CANVAS_FETCH_MODE", "courses"),
+            write_workers=int(os.getenv("CANVAS_SYNC_WRITE_WORKERS", "2")),
+            # Picked up by the next heartbeat, which stores it for the bot
+            on_progress=lambda event: latest.update(progress=event)
+        )
+    finally:
+        stop.set()
+        thread.join()
+
+
+def worker_main(worker_index: int, shards: int, queue_path: str = DEFAULT_QUEUE_PATH, stop_event=None, parent_pid: int | None = None):
+    """
+    Claim and run jobs until stop_event is set or the parent process exits,
+    preferring this worker's own shard.
+    """
+    worker_id = f"worker-{os.getpid()}-{worker_index}"
+    queue = SyncJobQueue(queue_path, shards)
+    cache = CanvasResponseCache(max_bytes=int(os.getenv("CANVAS_CACHE_MAX_MB", "50")) * 1024 * 1024)
+    own_shards = [worker_index % max(1, shards)]
+    print(f"[{worker_id}] Started, shards {own_shards} of {shards}")
+    next_purge = time.monotonic()
+
+    while (stop_event is None or not stop_event.is_set()) and parent_alive(parent_pid):
+        # One worker is enough to keep finished jobs from piling up
+        if worker_index == 0 and time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+            try:
+                queue.purge()
+            except Exception as e:
+                print(f"[{worker_id}] Purging old jobs failed: {e}")
+
+        try:
+            job = queue.claim(worker_id, own_shards)
+        except Exception as e:
+            print(f"[{worker_id}] Claim failed: {e}")
+            job = None
+
+        if job is None:
+            time.sleep(POLL_SECONDS)
+            continue
+
+        print(f"[{worker_id}] Running job {job['id']} for user {job['user_id']} (attempt {job['attempts']})")
+        try:
+            summary = run_job(queue, job, worker_id, cache)
+            queue.complete(job["id"], worker_id, summary)
+            print(f"[{worker_id}] Job {job['id']} done: {summary}")
+        except PermanentJobError as e:
+            queue.fail(job["id"], worker_id, str(e), permanent=True)
+            print(f"[{worker_id}] Job {job['id']} failed: {e}")
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(job["id"], worker_id, str(e))
+            print(f"[{worker_id}] Job {job['id']} failed, will retry: {e}")
+
+    queue.close()
+
+
+def start_worker_pool(workers: int, queue_path: str = DEFAULT_QUEUE_PATH):
+    """
+    Start one worker process per shard. Returns (processes, stop_event);
+    set the event to let workers finish their current job and exit.
+    """
+    # spawn: the workers must not inherit the bot's event loop, sockets or threads
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    processes = []
+    for index in range(workers):
+        process = context.Process(
+            target=worker_main,
+            args=(index, workers, queue_path, stop_event, os.getpid()),
+            name=f"canvas-sync-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes, stop_event
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Run Canvas sync workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+    parser.add_argument("--parent-pid", type=int, default=None, help="Exit when this process (e.g. the bot) exits")
+    args = parser.parse_args()
+
+    processes, stop_event = start_worker_pool(args.workers, args.queue)
+
+    # terminate() from the bot asks the workers to finish their current job and exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    try:
+        while any(process.is_alive() for process in processes):
+            if not parent_alive(args.parent_pid):
+                stop_event.set()
+            for process in processes:
+                process.join(timeout=POLL_SECONDS)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for process in processes:
+            process.join()
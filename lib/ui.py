@@ -5,14 +5,19 @@ from dateutil.parser import isoparse
 OnAction = Callable[[discord.Interaction], Awaitable[None]]
 
 class SelectTaskView(discord.ui.View):
-    """View with numbered emoji buttons for selecting which task to mark complete"""
-    def __init__(self, user_id: int, matches: List[Tuple[int, float]], items: list, on_select: Callable[[discord.Interaction, int], Awaitable[None]], on_cancel: Optional[OnAction] = None):
+    """
+    View with numbered emoji buttons for selecting which task to mark complete.
+    If on_select_many is given, a multi-select dropdown is added too so several
+    matches can be picked at once.
+    """
+    def __init__(self, user_id: int, matches: List[Tuple[int, float]], items: list, on_select: Callable[[discord.Interaction, int], Awaitable[None]], on_cancel: Optional[OnAction] = None, on_select_many: Optional[Callable[[discord.Interaction, List[int]], Awaitable[None]]] = None):
         super().__init__(timeout=60)
         self.user_id = user_id
         self.matches = matches
         self.items = items
         self.on_select = on_select
         self.on_cancel = on_cancel
+        self.on_select_many = on_select_many
         
         # Emoji numbers for buttons
         emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣"]
@@ -33,6 +38,30 @@ class SelectTaskView(discord.ui.View):
             button.callback = button_callback
             self.add_item(button)
         
+        # Add multi-select dropdown (Discord allows up to 25 options)
+        if on_select_many:
+            options = [
+                discord.SelectOption(
+                    label=(items[item_idx].get("title") or "Untitled")[:100],
+                    description=f"Match: {score:.0f}%",
+                    value=str(idx)
+                )
+                for idx, (item_idx, score) in enumerate(matches[:25])
+            ]
+            select = discord.ui.Select(
+                placeholder="Or pick several...",
+                min_values=1,
+                max_values=len(options),
+                options=options
+            )
+
+            async def select_callback(interaction: discord.Interaction):
+                await self.on_select_many(interaction, [int(v) for v in select.values])
+                self.stop()
+
+            select.callback = select_callback
+            self.add_item(select)
+
         # Add cancel button
         cancel_button = discord.ui.Button(label="Cancel", style=discord.ButtonStyle.danger)
         async def cancel_callback(interaction: discord.Interaction):
@@ -84,11 +113,12 @@ class ConfirmView(discord.ui.View):
         self.stop()
 
 
-def build_preview_embed(item: dict) -> discord.Embed:
+def build_preview_embed(item: dict, partial: bool = False) -> discord.Embed:
+    """Preview of a parsed item. partial=True while fields are still streaming in, missing ones show as pending."""
     embed = discord.Embed(title="Preview")
 
     item_type = item.get("type", "task")
-    title = (item.get("title") or "Untitled").strip().title()
+    title = (item.get("title") or ("…" if partial else "Untitled")).strip().title()
     location = item.get("location")
     assumptions = item.get("assumptions") or []
 
@@ -102,16 +132,21 @@ def build_preview_embed(item: dict) -> discord.Embed:
             start = isoparse(start_s)
             end = isoparse(end_s)
             when_text = f"{start:%a %b %d, %I:%M %p} – {end:%I:%M %p}"
+        elif start_s and partial and "end_time" not in item:
+            start = isoparse(start_s)
+            when_text = f"{start:%a %b %d, %I:%M %p} – …"
         elif start_s:
             start = isoparse(start_s)
             when_text = f"{start:%a %b %d, %I:%M %p} (end time missing)"
+        elif partial and "start_time" not in item:
+            when_text = "…"
         else:
             when_text = "⚠️ Could not determine time"
         embed.add_field(name="When", value=when_text, inline=False)
 
     if item_type == "task":
         due = item.get("due_date")
-        embed.add_field(name="Due", value=due or "—", inline=False)
+        embed.add_field(name="Due", value=due or ("…" if partial and "due_date" not in item else "—"), inline=False)
 
     if location:
         embed.add_field(name="Location", value=location, inline=False)
@@ -125,5 +160,5 @@ def build_preview_embed(item: dict) -> discord.Embed:
     if notes:
         embed.add_field(name="Notes", value=notes[:300], inline=False)
 
-    embed.set_footer(text="Confirm adding this item?")
+    embed.set_footer(text="Still parsing…" if partial else "Confirm adding this item?")
     return embed
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the bot's modules the same way bot.py does, from the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
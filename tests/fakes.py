@@ -0,0 +1,83 @@
+"""
+In-memory stand-ins for Canvas and the Google Tasks batch endpoint, so the sync
+can be exercised without network access.
+"""
+
+from datetime import datetime, timedelta, timezone
+from lib.canvas_client import CanvasClient, project
+
+
+def canvas_time(days: float) -> str:
+    """A Canvas-style UTC timestamp `days` from now."""
+    return (datetime.now(timezone.utc) + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeCanvasClient(CanvasClient):
+    """Serves courses, assignments and planner items from memory, recording every request."""
+
+    def __init__(self, courses: list[dict], assignments: dict | None = None, planner: list[dict] | None = None):
+        super().__init__("https://canvas.test", "token")
+        self.courses = courses
+        self.assignments = assignments or {}  # course_id -> list of assignments
+        self.planner = planner or []
+        self.requests = []
+
+    def iter_pages(self, path, params=None, fields=None):
+        params = dict(params or {})
+        self.requests.append((path, params))
+        if path == "/api/v1/courses":
+            items = self.courses
+        elif path.startswith("/api/v1/courses/") and path.endswith("/assignments"):
+            items = self.assignments.get(int(path.split("/")[4]), [])
+        elif path == "/api/v1/planner/items":
+            context = params.get("context_codes[]")
+            items = [i for i in self.planner if context is None or context == f"course_{i['course_id']}"]
+        else:
+            items = []
+        yield [project(item, fields) if fields else dict(item) for item in items]
+
+    def requests_for(self, path: str) -> list:
+        return [params for p, params in self.requests if p == path]
+
+
+class FakeRequest:
+    def __init__(self, kind: str, body: dict, task: str | None = None):
+        self.kind, self.body, self.task = kind, body, task
+
+
+class FakeTasksResource:
+    def insert(self, tasklist, body):
+        return FakeRequest("insert", body)
+
+    def update(self, tasklist, task, body):
+        return FakeRequest("update", body, task)
+
+
+class FakeTasksService:
+    def tasks(self):
+        return FakeTasksResource()
+
+
+class FakeGoogleTasks:
+    """Replaces get_tasks_service / execute_tasks_batch in lib.canvas_sync, keeping every write."""
+
+    def __init__(self):
+        self.writes = []  # (kind, google_task_id, body)
+        self._next_id = 0
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr("lib.canvas_sync.get_tasks_service", lambda creds: FakeTasksService())
+        monkeypatch.setattr("lib.canvas_sync.execute_tasks_batch", self.execute)
+
+    def execute(self, creds, requests, callback, batch_size=50):
+        for request_id, request in requests:
+            if request.kind == "insert":
+                self._next_id += 1
+                task_id = f"g-{self._next_id}"
+            else:
+                task_id = request.task
+            self.writes.append((request.kind, task_id, request.body))
+            callback(request_id, {"id": task_id}, None)
+
+    def kinds(self) -> list[str]:
+        return [kind for kind, _, _ in self.writes]
@@ -0,0 +1,65 @@
+import sqlite3
+from fakes import FakeCanvasClient, FakeGoogleTasks, canvas_time
+from lib.canvas_sync import sync_canvas_assignments_to_google_tasks
+
+COURSES = [{"id": 1, "name": "Math", "course_code": "M1"}]
+DUE = canvas_time(3)
+
+
+def make_client(updated_at: str, names=("hw1", "hw2")) -> FakeCanvasClient:
+    assignments = {1: [
+        {"id": 100 + i, "name": name, "due_at": DUE, "updated_at": updated_at, "html_url": ""}
+        for i, name in enumerate(names)
+    ]}
+    return FakeCanvasClient(COURSES, assignments)
+
+
+def sync(client, db_path):
+    # Full resync so every run lists the assignments and reaches the hash comparison
+    return sync_canvas_assignments_to_google_tasks(client, creds=None, db_path=str(db_path), full_resync=True)
+
+
+def test_canvas_edit_with_same_content_is_skipped(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client("2026-01-01T00:00:00Z"), db_path)
+    assert google.kinds() == ["insert", "insert"]
+
+    summary = sync(make_client("2026-02-01T00:00:00Z"), db_path)
+    assert summary == {"created": 0, "updated": 0, "skipped": 2, "errors": 0}
+    assert google.kinds() == ["insert", "insert"]
+
+    # The newer updated_at is still recorded for the skipped assignments
+    conn = sqlite3.connect(db_path)
+    stored = {row[0] for row in conn.execute("SELECT canvas_updated_at FROM canvas_task_map")}
+    assert stored == {"2026-02-01T00:00:00Z"}
+
+
+def test_changed_content_is_written(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client("2026-01-01T00:00:00Z"), db_path)
+
+    summary = sync(make_client("2026-01-01T00:00:00Z", names=("hw1", "hw2 (revised)")), db_path)
+    assert summary["updated"] == 1
+    assert summary["skipped"] == 1
+    assert google.kinds() == ["insert", "insert", "update"]
+
+
+def test_mappings_without_a_hash_are_backfilled(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client("2026-01-01T00:00:00Z"), db_path)
+
+    # As if the rows were written before hashes were stored
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE canvas_task_map SET content_hash=NULL")
+    conn.commit()
+
+    summary = sync(make_client("2026-01-01T00:00:00Z"), db_path)
+    assert summary["skipped"] == 2
+    assert google.kinds() == ["insert", "insert"]
+    assert conn.execute("SELECT COUNT(*) FROM canvas_task_map WHERE content_hash IS NULL").fetchone()[0] == 0
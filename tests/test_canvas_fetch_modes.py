@@ -0,0 +1,58 @@
+import sqlite3
+from fakes import FakeCanvasClient, FakeGoogleTasks, canvas_time
+from lib.canvas_sync import sync_canvas_assignments_to_google_tasks
+
+COURSES = [{"id": 1, "name": "Math", "course_code": "M1"}]
+DUE = canvas_time(3)
+UPDATED = "2026-01-01T00:00:00Z"
+
+
+def make_client() -> FakeCanvasClient:
+    # One plain assignment and one quiz, which the planner links to the quiz page
+    assignments = {1: [
+        {"id": 101, "name": "hw1", "due_at": DUE, "updated_at": UPDATED, "points_possible": 10,
+         "html_url": "https://canvas.test/courses/1/assignments/101"},
+        {"id": 102, "name": "quiz1", "due_at": DUE, "updated_at": UPDATED, "points_possible": 5,
+         "html_url": "https://canvas.test/courses/1/assignments/102"},
+    ]}
+    planner = [
+        {"plannable_id": 101, "plannable_type": "assignment", "course_id": 1,
+         "html_url": "/courses/1/assignments/101",
+         "plannable": {"title": "hw1", "due_at": DUE, "updated_at": UPDATED, "points_possible": 10}},
+        {"plannable_id": 55, "plannable_type": "quiz", "course_id": 1,
+         "html_url": "/courses/1/quizzes/55",
+         "plannable": {"id": 55, "assignment_id": 102, "title": "quiz1", "due_at": DUE, "updated_at": UPDATED, "points_possible": 5}},
+    ]
+    return FakeCanvasClient(COURSES, assignments, planner)
+
+
+def stored_hashes(db_path) -> dict:
+    conn = sqlite3.connect(db_path)
+    return dict(conn.execute("SELECT canvas_assignment_id, content_hash FROM canvas_task_map"))
+
+
+def test_both_fetch_modes_produce_the_same_tasks(tmp_path, monkeypatch):
+    hashes, bodies = {}, {}
+    for mode in ("courses", "planner"):
+        google = FakeGoogleTasks()
+        google.install(monkeypatch)
+        db_path = tmp_path / f"{mode}.db"
+        sync_canvas_assignments_to_google_tasks(make_client(), creds=None, db_path=str(db_path), fetch_mode=mode)
+        hashes[mode] = stored_hashes(db_path)
+        bodies[mode] = sorted((body["title"], body["notes"]) for _, _, body in google.writes)
+
+    assert hashes["courses"] == hashes["planner"]
+    assert bodies["courses"] == bodies["planner"]
+
+
+def test_switching_fetch_mode_writes_nothing(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = str(tmp_path / "sync.db")
+    sync_canvas_assignments_to_google_tasks(make_client(), creds=None, db_path=db_path, fetch_mode="courses")
+
+    summary = sync_canvas_assignments_to_google_tasks(
+        make_client(), creds=None, db_path=db_path, fetch_mode="planner", full_resync=True
+    )
+    assert summary == {"created": 0, "updated": 0, "skipped": 2, "errors": 0}
+    assert google.kinds() == ["insert", "insert"]
@@ -0,0 +1,73 @@
+from fakes import FakeCanvasClient, FakeGoogleTasks, canvas_time
+from lib.canvas_sync import sync_canvas_assignments_to_google_tasks
+
+COURSES = [{"id": 1, "name": "Math", "course_code": "M1"}, {"id": 2, "name": "CS", "course_code": "C2"}]
+
+
+def make_client(updated_at: str = "2026-01-01T00:00:00Z") -> FakeCanvasClient:
+    due = canvas_time(3)
+    assignments = {
+        cid: [{"id": cid * 100 + i, "name": f"hw{i}", "due_at": due, "updated_at": updated_at, "html_url": ""} for i in (1, 2)]
+        for cid in (1, 2)
+    }
+    planner = [
+        {"plannable_id": a["id"], "plannable_type": "assignment", "course_id": cid, "html_url": "",
+         "plannable": {"title": a["name"], "due_at": due, "updated_at": a["updated_at"]}}
+        for cid, items in assignments.items() for a in items
+    ]
+    return FakeCanvasClient(COURSES, assignments, planner)
+
+
+def sync(client, db_path, **kwargs):
+    return sync_canvas_assignments_to_google_tasks(client, creds=None, db_path=str(db_path), **kwargs)
+
+
+def test_unchanged_courses_skip_the_assignment_listing(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+
+    first = sync(make_client(), db_path)
+    assert first["created"] == 4
+
+    client = make_client()
+    second = sync(client, db_path)
+    assert second == {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
+    # Only the cheap planner probes ran, no course's assignments were listed
+    assert not [p for p, _ in client.requests if p.endswith("/assignments")]
+    assert len(client.requests_for("/api/v1/planner/items")) == 2
+
+
+def test_newer_canvas_update_refetches_the_course(tmp_path, monkeypatch):
+    google = FakeGoogleTasks()
+    google.install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client(), db_path)
+
+    client = make_client(updated_at="2026-02-01T00:00:00Z")
+    sync(client, db_path)
+    assert len([p for p, _ in client.requests if p.endswith("/assignments")]) == 2
+
+
+def test_full_resync_ignores_watermarks(tmp_path, monkeypatch):
+    FakeGoogleTasks().install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client(), db_path)
+
+    client = make_client()
+    sync(client, db_path, full_resync=True)
+    assert len([p for p, _ in client.requests if p.endswith("/assignments")]) == 2
+    assert not client.requests_for("/api/v1/planner/items")
+
+
+def test_planner_probe_window_is_stable_within_the_hour(tmp_path, monkeypatch):
+    FakeGoogleTasks().install(monkeypatch)
+    db_path = tmp_path / "sync.db"
+    sync(make_client(), db_path)
+
+    client = make_client()
+    sync(client, db_path)
+    # Same start_date on every probe, so the response cache key doesn't change per request
+    start_dates = {params["start_date"] for params in client.requests_for("/api/v1/planner/items")}
+    assert len(start_dates) == 1
+    assert start_dates.pop().endswith(":00:00Z")
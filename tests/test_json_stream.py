@@ -0,0 +1,68 @@
+import json
+import pytest
+from lib.json_stream import IncrementalJSONObjectParser
+
+REPLY = {
+    "type": "event",
+    "title": "Dinner with Sam",
+    "start_time": "2026-10-14T19:00:00-07:00",
+    "end_time": None,
+    "location": "Olive Garden, \"downtown\"",
+    "priority": 2,
+    "all_day": False,
+    "assumptions": ["default duration 120 min", "{not a brace}"],
+}
+
+
+def feed_in_chunks(text: str, size: int) -> tuple[IncrementalJSONObjectParser, list[dict]]:
+    parser = IncrementalJSONObjectParser()
+    updates = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return parser, updates
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_any_chunking_yields_the_whole_object(size):
+    parser, updates = feed_in_chunks(json.dumps(REPLY, indent=2), size)
+    assert parser.done
+    assert parser.fields == REPLY
+    # Every field is reported exactly once
+    reported = [key for update in updates for key in update]
+    assert sorted(reported) == sorted(REPLY)
+
+
+def test_fields_are_reported_as_soon_as_they_complete():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"type": "ta') == {}
+    assert parser.feed('sk", "title": "Essay"') == {"type": "task", "title": "Essay"}
+    assert parser.fields == {"type": "task", "title": "Essay"}
+    assert not parser.done
+
+
+def test_number_waits_for_a_delimiter():
+    parser = IncrementalJSONObjectParser()
+    # "12" could still become "120"
+    assert parser.feed('{"minutes": 12') == {}
+    assert parser.feed('0}') == {"minutes": 120}
+    assert parser.done
+
+
+def test_text_around_the_object_is_ignored():
+    parser = IncrementalJSONObjectParser()
+    parser.feed('Sure! ```json\n')
+    parser.feed('{"type": "task"}\n```')
+    assert parser.done
+    assert parser.fields == {"type": "task"}
+    # Nothing after the closing brace is parsed
+    assert parser.feed('{"type": "event"}') == {}
+
+
+def test_nested_values_complete_as_a_whole():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"assumptions": ["a", "b"') == {}
+    assert parser.feed(']}') == {"assumptions": ["a", "b"]}
+
+
+def test_missing_colon_is_an_error():
+    parser = IncrementalJSONObjectParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"type" "task"}')
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from lib.llm_cache import ParseCache
+
+
+class ThreadRecordingConnection:
+    """Wraps the SQLite connection and records which threads used it."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.threads = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, *args):
+        self.threads.append(threading.get_ident())
+        return self._conn.execute(*args)
+
+    def commit(self):
+        self.threads.append(threading.get_ident())
+        return self._conn.commit()
+
+
+def run_calls(cache: ParseCache, texts: list[str], response: str = '{"type": "task"}') -> tuple[list[str], int]:
+    calls = []
+
+    async def call(current_date):
+        calls.append(current_date)
+        return response
+
+    async def main():
+        for text in texts:
+            await cache.get_or_call(text, "model", call)
+        # Let the background disk writes finish
+        await asyncio.sleep(0.1)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    return calls, loop_thread
+
+
+def test_repeated_phrase_is_answered_from_the_cache(tmp_path):
+    cache = ParseCache(str(tmp_path / "llm.db"))
+    calls, _ = run_calls(cache, ["Gym at 6pm", "gym   at 6PM"])
+    assert len(calls) == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_entries_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / "llm.db")
+    run_calls(ParseCache(db_path), ["cs hw due friday"])
+
+    restarted = ParseCache(db_path)
+    calls, _ = run_calls(restarted, ["cs hw due friday"])
+    assert calls == []
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_sqlite_never_runs_on_the_event_loop(tmp_path):
+    cache = ParseCache(str(tmp_path / "llm.db"))
+    cache.conn = ThreadRecordingConnection(cache.conn)
+    _, loop_thread = run_calls(cache, ["gym at 6pm", "dinner at 7pm"])
+    assert cache.conn.threads
+    assert loop_thread not in cache.conn.threads
+
+
+def test_unusable_response_is_not_cached(tmp_path):
+    cache = ParseCache(str(tmp_path / "llm.db"))
+    calls, _ = run_calls(cache, ["gym at 6pm", "gym at 6pm"], response="not json")
+    assert len(calls) == 2
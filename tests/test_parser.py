@@ -0,0 +1,89 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import pytest
+from lib.parser import parse_text
+
+TZ = ZoneInfo("America/Los_Angeles")
+# A Wednesday morning
+NOW = datetime(2026, 10, 14, 9, 0, tzinfo=TZ)
+
+# bot.LOCAL_PARSE_THRESHOLD's default: below it /add asks the LLM instead
+THRESHOLD = 0.75
+
+
+def parse(text: str):
+    return parse_text(text, now=NOW)
+
+
+@pytest.mark.parametrize("text, title, due_date", [
+    ("turn in lab", "turn in lab", "2026-10-14"),
+    ("hw in math", "hw in math", "2026-10-14"),
+    ("essay in english due friday", "essay in english", "2026-10-16"),
+    ("quiz in chem tomorrow", "quiz in chem", "2026-10-15"),
+    ("due friday: cs hw", "cs hw", "2026-10-16"),
+    ("cs hw: due friday", "cs hw", "2026-10-16"),
+    ("turn in essay tomorrow", "turn in essay", "2026-10-15"),
+    ("submit pset 3 by friday", "submit pset 3", "2026-10-16"),
+])
+def test_tasks_keep_in_phrases_in_the_title(text, title, due_date):
+    item = parse(text)
+    assert item.kind == "task"
+    assert item.title == title
+    assert item.location is None
+    assert item.due_date == due_date
+    assert item.confidence >= THRESHOLD
+
+
+def test_event_with_time_and_place():
+    item = parse("dinner at 7pm at olive garden")
+    assert item.kind == "event"
+    assert item.title == "dinner"
+    assert item.location == "olive garden"
+    assert item.when == "2026-10-14T19:00:00-07:00"
+    # Dinner defaults to two hours
+    assert item.end == "2026-10-14T21:00:00-07:00"
+    assert item.confidence >= THRESHOLD
+
+
+def test_in_location_is_left_to_the_llm():
+    item = parse("meeting at 3pm in room 204")
+    assert item.kind == "event"
+    assert item.location == "room 204"
+    assert item.confidence < THRESHOLD
+
+
+def test_title_keeps_words_starting_with_connectors():
+    item = parse("online meeting at 3pm")
+    assert item.title == "online meeting"
+    assert item.location is None
+
+
+def test_bare_time_that_passed_means_tomorrow():
+    item = parse("call mom at 8am")
+    assert item.when == "2026-10-15T08:00:00-07:00"
+    assert "time already passed today, using tomorrow" in item.assumptions
+
+
+@pytest.mark.parametrize("text", [
+    "gym every monday at 6pm",
+    "meeting monday or tuesday at 3pm",
+    "study 2-4pm tomorrow",
+    "lunch sometime next week",
+])
+def test_ambiguous_input_goes_to_the_llm(text):
+    assert parse(text).confidence < THRESHOLD
+
+
+def test_next_weekday_is_flagged():
+    item = parse("project due next friday")
+    assert item.due_date == "2026-10-16"
+    assert item.assumptions == ["next fri = Oct 16"]
+    assert item.confidence < 1.0
+
+
+def test_payload_matches_the_llm_schema():
+    payload = parse("lunch with sam tomorrow at noon").to_payload()
+    assert payload["type"] == "event"
+    assert payload["title"] == "lunch with sam"
+    assert payload["start_time"] == "2026-10-15T12:00:00-07:00"
+    assert payload["due_date"] is None
@@ -0,0 +1,47 @@
+import sqlite3
+from lib.sync_db import MIGRATIONS, init_db, load_mappings, migrate
+
+
+def columns(conn, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_new_database_is_at_the_latest_version(tmp_path):
+    conn = init_db(str(tmp_path / "sync.db"))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert "content_hash" in columns(conn, "canvas_task_map")
+
+
+def test_unversioned_database_is_upgraded_in_place(tmp_path):
+    db_path = str(tmp_path / "sync.db")
+
+    # The schema as it was before migrations existed, with a synced assignment
+    legacy = sqlite3.connect(db_path)
+    legacy.execute("""
+        CREATE TABLE canvas_task_map (
+            canvas_assignment_id INTEGER PRIMARY KEY,
+            course_id INTEGER NOT NULL,
+            google_task_id TEXT NOT NULL,
+            canvas_updated_at TEXT,
+            canvas_due_at TEXT,
+            last_synced_at TEXT
+        )
+    """)
+    legacy.execute("INSERT INTO canvas_task_map VALUES (7, 1, 'g-7', '2026-01-01T00:00:00Z', '2026-01-10', '2026-01-01')")
+    legacy.commit()
+    legacy.close()
+
+    conn = init_db(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    # Existing rows survive, the hash is filled in by the next sync
+    assert load_mappings(conn, [1]) == {7: ("g-7", "2026-01-01T00:00:00Z", "2026-01-10", None)}
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name='idx_canvas_task_map_course'").fetchone()
+
+
+def test_migrate_is_a_no_op_when_up_to_date(tmp_path):
+    db_path = str(tmp_path / "sync.db")
+    init_db(db_path).close()
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
@@ -0,0 +1,131 @@
+import pytest
+from lib import sync_jobs
+from lib.sync_jobs import SyncJobQueue, retry_delay, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SyncJobQueue(str(tmp_path / "jobs.db"), shards=2)
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(sync_jobs, "retry_delay", lambda attempts: 0)
+
+
+def test_enqueue_reuses_a_queued_job(queue):
+    first = queue.enqueue(7)
+    assert queue.enqueue(7, full=True) == first
+    assert queue.get(first)["full"] is True
+    assert queue.stats() == {"queued": 1}
+
+
+def test_claim_leases_one_job_per_user(queue):
+    job_id = queue.enqueue(7)
+    job = queue.claim("w1")
+    assert job["id"] == job_id
+    assert job["status"] == "running"
+    assert job["attempts"] == 1
+
+    # A second sync for the same user waits until the first one finishes
+    queue.enqueue(7)
+    assert queue.claim("w2") is None
+    queue.complete(job_id, "w1", {"created": 1})
+    assert queue.claim("w2")["user_id"] == 7
+
+
+def test_claim_prefers_own_shard(queue):
+    queue.enqueue(2)  # shard 0
+    queue.enqueue(3)  # shard 1
+    assert queue.claim("w1", shards=[1])["user_id"] == 3
+    # Nothing left in shard 1, so the worker helps with shard 0
+    assert queue.claim("w1", shards=[1])["user_id"] == 2
+
+
+def test_heartbeat_fails_once_the_lease_is_lost(queue, no_backoff):
+    job_id = queue.enqueue(7)
+    queue.claim("w1", lease_seconds=-1)
+    assert queue.claim("w2")["id"] == job_id
+    assert not queue.heartbeat(job_id, "w1")
+    assert queue.heartbeat(job_id, "w2", progress={"courses_done": 1})
+    assert queue.get(job_id)["progress"] == {"courses_done": 1}
+
+
+def test_expired_lease_counts_as_an_attempt(queue, no_backoff):
+    job_id = queue.enqueue(7, max_attempts=2)
+
+    # Both workers die without renewing the lease
+    assert queue.claim("w1", lease_seconds=-1)["attempts"] == 1
+    assert queue.claim("w2", lease_seconds=-1)["attempts"] == 2
+
+    assert queue.claim("w3") is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "worker stopped" in job["error"]
+
+
+def test_failed_attempt_is_retried_with_backoff(queue, monkeypatch):
+    monkeypatch.setattr(sync_jobs, "retry_delay", lambda attempts: 60)
+    job_id = queue.enqueue(7)
+    queue.claim("w1")
+    queue.fail(job_id, "w1", "Canvas timed out")
+
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["error"] == "Canvas timed out"
+    # Not runnable until the backoff has passed
+    assert queue.claim("w1") is None
+
+
+def test_fail_gives_up_after_max_attempts(queue, no_backoff):
+    job_id = queue.enqueue(7, max_attempts=2)
+    for _ in range(2):
+        queue.claim("w1")
+        queue.fail(job_id, "w1", "boom")
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_permanent_failure_is_not_retried(queue):
+    job_id = queue.enqueue(7)
+    queue.claim("w1")
+    queue.fail(job_id, "w1", "No linked Canvas account", permanent=True)
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_retry_merges_into_a_job_queued_meanwhile(queue):
+    job_id = queue.enqueue(7, full=True)
+    queue.claim("w1")
+    newer = queue.enqueue(7)
+
+    queue.fail(job_id, "w1", "boom")
+    assert queue.stats() == {"queued": 1, "failed": 1}
+    assert queue.get(job_id)["error"] == f"boom Retrying as job {newer}."
+    # The retry keeps asking for a full resync
+    assert queue.get(newer)["full"] is True
+
+
+def test_fail_from_a_worker_that_lost_the_lease_is_ignored(queue, no_backoff):
+    job_id = queue.enqueue(7)
+    queue.claim("w1", lease_seconds=-1)
+    queue.claim("w2")
+    queue.fail(job_id, "w1", "late failure", permanent=True)
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_purge_drops_old_finished_jobs(queue):
+    done = queue.enqueue(7)
+    queue.claim("w1")
+    queue.complete(done, "w1", {})
+    waiting = queue.enqueue(8)
+
+    queue.purge(older_than_seconds=-1)
+    assert queue.get(done) is None
+    assert queue.get(waiting) is not None
+
+
+def test_retry_delay_is_full_jitter():
+    for attempts in range(1, 12):
+        cap = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+        assert all(0 <= retry_delay(attempts) <= cap for _ in range(50))